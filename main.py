@@ -4,16 +4,107 @@
 # all code was placed into one file for grading purposes.
 
 
-import json
-import urllib.parse
-import urllib.request
+# networking, storage and server modules (json, urllib, asyncio, sqlite3, ...) are imported by the functions that use
+# them, so that a game that does not need them starts right away.
+import bisect
+import hashlib
+import itertools
+import math
+import mmap
+import operator
+import os
+import re
+import struct
+import threading
+import queue
 import random
+import sys
+import time
+import zlib
 
+from array import array
 from pathlib import Path
 from time import sleep
 
 
 GLOBAL_SLEEP = 2
+GRAVITATIONAL_CONSTANT = 6.674e-11      # in m^3/kg/s/s.
+SUN_MASS = 1.989e30                     # in kg, for the orbital period of everything that does not orbit a planet.
+CACHE_DIRECTORY = Path.home() / ".cache" / "solar-system-higher-lower"
+DATA_DIRECTORY = Path.home() / ".local" / "share" / "solar-system-higher-lower"
+
+
+class Metrics:
+    """Counters and latency histograms for the hot paths (ingestion, body selection, answer checking and rendering).
+    Metrics are off by default, and every call site checks the enabled flag before reading the clock, so they cost a
+    single attribute lookup when off. A snapshot can be exported as JSON or in the Prometheus text format."""
+    # upper bounds of the latency buckets in seconds, like a Prometheus histogram's "le" labels.
+    BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0, float("inf"))
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._counters = dict()
+        self._histograms = dict()               # name -> [count per bucket, sum of observations].
+        self._lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Adds to a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Records a latency into a histogram."""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = [[0] * len(Metrics.BUCKETS), 0.0]
+            histogram[0][bisect.bisect_left(Metrics.BUCKETS, seconds)] += 1
+            histogram[1] += seconds
+
+    def since(self, name: str, start: float) -> None:
+        """Records the time elapsed since a time.perf_counter() reading."""
+        self.observe(name, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self) -> dict:
+        """Returns every counter and histogram. Histogram buckets are cumulative, as in Prometheus."""
+        with self._lock:
+            histograms = {name: {"buckets": dict(zip(map(str, Metrics.BUCKETS), itertools.accumulate(counts))),
+                                 "count": sum(counts), "sum": total}
+                          for name, (counts, total) in self._histograms.items()}
+            return {"counters": dict(self._counters), "histograms": histograms}
+
+    def to_json(self) -> str:
+        import json
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = "higher_lower_") -> str:
+        """Returns the snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = list()
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {prefix}{name} counter")
+            lines.append(f"{prefix}{name} {value}")
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'{prefix}{name}_bucket{{le="{"+Inf" if bound == "inf" else bound}"}} {count}')
+            lines.append(f"{prefix}{name}_sum {histogram['sum']}")
+            lines.append(f"{prefix}{name}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        """Writes the snapshot to a file, as JSON if it ends in .json and in the Prometheus format otherwise."""
+        Path(path).write_text(self.to_json() if Path(path).suffix == ".json" else self.to_prometheus(),
+                              encoding="utf-8")
+
+
+# metrics shared by the whole process, see Metrics.
+METRICS = Metrics()
 
 
 class Body:
@@ -61,59 +152,1775 @@ class Body:
         return self._units[characteristic]
 
 
-class HigherLower:
-    """Class representing the actual higher-lower game. It can take into account semimajor axis size, eccentricity,
-    mass, gravity, and radius of two different bodies."""
-    def __init__(self, solar_system: dict):
-        # by default, the game has all settings enabled and is not a single category game.
-        self._category = {"Semimajor Axis": True, "Eccentricity": True, "Mass": True, "Gravity": True, "Radius": True}
-        temp = iter(self._category.values())
-        self._single = any(temp) and not any(temp)
+class BodyView:
+    """Lightweight view of a single row inside a BodyCatalog. It offers the same getters as Body without copying."""
+    __slots__ = ("_catalog", "_index")
+
+    def __init__(self, catalog: "BodyCatalog", index: int):
+        self._catalog = catalog                 # catalog that owns the columns.
+        self._index = index                     # row of this body inside every column.
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BodyView) and self._catalog is other._catalog and self._index == other._index
+
+    def __hash__(self) -> int:
+        return hash((id(self._catalog), self._index))
+
+    def __repr__(self) -> str:
+        return f"BodyView({self._index}, {self.get_name()!r})"
+
+    def get_index(self) -> int:
+        return self._index
+
+    def get_name(self) -> str:
+        return self._catalog._names[self._index]
+
+    def get_semimajor_axis(self) -> int:
+        return self._catalog._typed(self._catalog._semimajor, self._index, 0)
+
+    def get_eccentricity(self) -> float:
+        return self._catalog._typed(self._catalog._eccentricity, self._index, 1)
+
+    def get_mass(self) -> str:
+        return f"{self._catalog._typed(self._catalog._mass_value, self._index, 2)} x " \
+               f"10^{self._catalog._mass_exponent[self._index]}"
+
+    def get_gravity(self) -> float:
+        return self._catalog._typed(self._catalog._gravity, self._index, 3)
+
+    def get_radius(self) -> int:
+        return self._catalog._typed(self._catalog._radius, self._index, 4)
+
+    def get_type(self) -> str:
+        return self._catalog._type_names[self._catalog._type[self._index]]
+
+    def get_mass_raw(self) -> {float, int}:
+        catalog = self._catalog
+        return catalog._typed(catalog._mass_value, self._index, 2), catalog._mass_exponent[self._index]
+
+    def get_perihelion(self) -> int:
+        return BodyCatalog._restore(self._catalog.column("Perihelion")[self._index])
+
+    def get_aphelion(self) -> int:
+        return BodyCatalog._restore(self._catalog.column("Aphelion")[self._index])
+
+    def get_density(self) -> float:
+        return self._catalog.column("Density")[self._index]
+
+    def get_escape_velocity(self) -> float:
+        return self._catalog.column("Escape Velocity")[self._index]
+
+    def get_orbital_period(self) -> float:
+        return self._catalog.column("Orbital Period")[self._index]
+
+    def get_units(self, characteristic: str) -> str:
+        return BodyCatalog.UNITS[characteristic]
+
+    def display(self, characteristic: str) -> str:
+        """Returns the value of the characteristic formatted for display, see BodyCatalog.display_value."""
+        return self._catalog.display_value(self._index, characteristic)
+
+
+class StringColumn:
+    """Read-only column of strings stored as one UTF-8 blob and an array of offsets. Strings are only decoded when
+    they are looked up, so a memory-mapped snapshot never has to decode the names it does not use."""
+    __slots__ = ("_offsets", "_blob")
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets                 # offsets[i]:offsets[i + 1] is the i-th string within the blob.
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @staticmethod
+    def encode(strings) -> tuple:
+        """Returns the offsets and blob for a sequence of strings."""
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = array("I", [0])
+        for string in encoded:
+            offsets.append(offsets[-1] + len(string))
+        return offsets, b"".join(encoded)
+
+
+class BodyCatalog:
+    """Columnar storage for every Solar System object. Each characteristic lives in its own typed array, so the
+    memory of the catalog grows with the number of columns rather than with a Body (and its dictionary) per object."""
+    # units are shared by every body instead of being copied into each one.
+    UNITS = {"Semimajor Axis": "km", "Eccentricity": "", "Mass": "kg", "Gravity": "m/s/s", "Radius": "km",
+             "Perihelion": "km", "Aphelion": "km", "Density": "g/cm^3", "Escape Velocity": "m/s",
+             "Orbital Period": "days"}
+
+    # characteristics that are not in the API records but derived from the other columns (see _derive).
+    DERIVED = ("Perihelion", "Aphelion", "Density", "Escape Velocity", "Orbital Period")
+
+    # binary snapshot layout: a header followed by length-prefixed sections, each padded to 8 bytes.
+    SNAPSHOT_MAGIC = b"SSHLSNAP"
+    SNAPSHOT_VERSION = 6
+    # magic, version, reserved, number of bodies, crc32 of the sections, padded to 24 bytes so that every section
+    # starts on an 8-byte boundary of the mapping.
+    SNAPSHOT_HEADER = struct.Struct("<8sHHII4x")
+    SNAPSHOT_SECTION = struct.Struct("<Q")
+
+    # most formatted values kept by each catalog (see display_value).
+    DISPLAY_CACHE_SIZE = 4096
+
+    # fields pulled out of each API record by the batch ingestion, in column order.
+    RECORD_FIELDS = ("englishName", "semimajorAxis", "eccentricity", "mass", "gravity", "meanRadius", "bodyType")
+
+    # the stored columns whose values keep the int-ness the API sent them with, in the bit order of _integral.
+    INTEGRAL = ("Semimajor Axis", "Eccentricity", "Mass", "Gravity", "Radius")
+
+    def __init__(self):
+        self._names = list()                    # english names.
+        self._semimajor = array("d")            # semimajor axis in km.
+        self._eccentricity = array("d")         # orbital eccentricity.
+        self._mass_value = array("d")           # mass mantissa, normally within [1, 10].
+        self._mass_exponent = array("h")        # mass exponent in 10^n kg.
+        self._gravity = array("d")              # surface gravity in m/s/s.
+        self._radius = array("d")               # mean radius in km.
+        self._type = array("B")                 # index into self._type_names.
+        self._ids = list()                      # API ids, "" if the record had none.
+        self._parents = list()                  # API id of the planet a moon orbits, "" for everything else.
+        self._integral = array("B")             # bit n is set when the API sent column n of INTEGRAL as an integer.
+
+        # columns derived from the ones above, keyed by characteristic (see _derive).
+        self._derived = dict()
+
+        # lazily built indices for search: the bodies of each type, the moons of each planet, the lowercase names in
+        # sorted order, and every characteristic's values in sorted order.
+        self._by_type = None
+        self._by_parent = None
+        self._name_order = None
+        self._sorted = dict()
+
+        # once built, a catalog is only read, so one catalog is shared by every game and thread. The caches below are
+        # built lazily under this lock, and every cache is stored only once it is complete.
+        self._lock = threading.RLock()
+
+        # body types are interned since there are only a handful of them (Star, Planet, Moon, ...).
+        self._type_names = list()
+        self._type_lookup = dict()
+
+        # indices of the bodies with a non-zero value, built once per characteristic on first use.
+        self._valid = dict()
+
+        # one orderable sort key per body and characteristic (see sort_keys).
+        self._keys = dict()
+
+        # bodies ordered by the log10 of their value per characteristic, built once on first use (see log_order).
+        self._log_order = dict()
+
+        # position of every body by its key, built on first use (see _ids_lookup).
+        self._id_lookup = None
+
+        # crc32 of everything a game depends on, built on first use (see fingerprint).
+        self._fingerprint = None
+
+        # memory map backing the columns when the catalog was loaded from a snapshot.
+        self._snapshot = None
+
+        # values are only formatted when a round shows them, and the most recent ones are kept in a bounded LRU cache
+        # keyed by (index, characteristic). Appending bodies can change derived values, so _changed empties it.
+        self._display = dict()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    @staticmethod
+    def _restore(value: float) -> {int, float}:
+        """Returns integral values as an int so that they are displayed the same way the API provided them."""
+        return int(value) if value.is_integer() else value
+
+    def _typed(self, column: array, index: int, bit: int) -> {int, float}:
+        """Returns a stored value as an int if the API sent it as one, so that it is displayed the same way."""
+        value = column[index]
+        return int(value) if self._integral[index] >> bit & 1 else value
+
+    @staticmethod
+    def _parse_record(prefiltered_body: dict) -> tuple | None:
+        """Performs the same filtering as HigherLower._create_body, but returns a plain row instead of a Body."""
+        name = prefiltered_body["englishName"]
+        semimajor = prefiltered_body["semimajorAxis"]
+        eccentricity = prefiltered_body["eccentricity"]
+        gravity = prefiltered_body["gravity"]
+        radius = prefiltered_body["meanRadius"]
+        body_type = prefiltered_body["bodyType"]
+        mass = prefiltered_body["mass"]
+
+        # if any of the fields are missing, or the moon does not have a recognizable English name, we skip it.
+        if None in (name, semimajor, eccentricity, mass, gravity, radius, body_type) or "S/" in name:
+            return None
+
+        # a mass of 0 (or less) can never be put into scientific notation.
+        mass_value, mass_exponent = mass["massValue"], mass["massExponent"]
+        if mass_value is None or mass_exponent is None or mass_value <= 0:
+            return None
+
+        # the mass value must be in the proper scientific notation format.
+        if mass_value > 10 or mass_value < 1:
+            mass_value, mass_exponent = HigherLower._fix_mass(mass_value, mass_exponent)
+
+        return (name.lstrip("0123456789 "), semimajor, eccentricity, mass_value, mass_exponent,
+                gravity, radius, body_type, prefiltered_body.get("id") or "",
+                (prefiltered_body.get("aroundPlanet") or {}).get("planet") or "")
+
+    def append(self, name: str, semimajor_axis: {int, float}, eccentricity: float, mass_value: float,
+               mass_exponent: int, gravity: float, mean_radius: {int, float}, body_type: str, body_id: str = "",
+               parent_id: str = "") -> int:
+        """Appends a single body to every column and returns its index."""
+        type_index = self._type_lookup.get(body_type)
+        if type_index is None:
+            type_index = self._type_lookup[body_type] = len(self._type_names)
+            self._type_names.append(body_type)
+
+        self._names.append(name)
+        self._semimajor.append(semimajor_axis)
+        self._eccentricity.append(eccentricity)
+        self._mass_value.append(mass_value)
+        self._mass_exponent.append(mass_exponent)
+        self._gravity.append(gravity)
+        self._radius.append(mean_radius)
+        self._type.append(type_index)
+        self._ids.append(body_id)
+        self._parents.append(parent_id)
+        self._integral.append(sum(1 << bit for bit, value in
+                                  enumerate((semimajor_axis, eccentricity, mass_value, gravity, mean_radius))
+                                  if type(value) is int))
+        self._changed()
+        return len(self._names) - 1
+
+    def _changed(self) -> None:
+        """Forgets everything that was built from the columns, after bodies were appended."""
+        self._valid.clear()
+        self._keys.clear()
+        self._log_order.clear()
+        self._derived.clear()
+        self._id_lookup = None
+        self._fingerprint = None
+        self._by_type = None
+        self._by_parent = None
+        self._name_order = None
+        self._sorted.clear()
+        self._display.clear()
+
+    def add_record(self, prefiltered_body: dict) -> bool:
+        """Appends a body straight from an API record. Returns whether the record was valid."""
+        row = BodyCatalog._parse_record(prefiltered_body)
+        if row is None:
+            return False
+        self.append(*row)
+        return True
+
+    @staticmethod
+    def _normalize_masses(values: list, exponents: list) -> tuple:
+        """Puts a whole column of masses into scientific notation at once. The exponent is taken from log10 rather
+        than HigherLower._fix_mass's loop, which gives exactly the same rounded mantissa except when the mantissa lands
+        right next to a rounding or decade boundary; those rare masses fall back to HigherLower._fix_mass itself."""
+        fix = [index for index, value in enumerate(values) if value > 10 or value < 1]
+        if not fix:
+            return values, exponents
+
+        mantissas, exponents = list(values), list(exponents)
+        floor, log10 = math.floor, math.log10
+        unfixed = [values[index] for index in fix]
+        shifts = [floor(log10(value)) for value in unfixed]
+        scaled = [value / 10.0 ** shift if shift > 0 else value * 10.0 ** -shift
+                  for value, shift in zip(unfixed, shifts)]
+
+        for index, value, shift, mantissa in zip(fix, unfixed, shifts, scaled):
+            thousandths = mantissa * 1000
+            if 1 + 1e-9 < mantissa < 10 - 1e-8 and abs(thousandths - floor(thousandths) - 0.5) > 1e-6:
+                mantissas[index], exponents[index] = round(mantissa, 3), exponents[index] + shift
+            else:
+                mantissas[index], exponents[index] = HigherLower._fix_mass(value, exponents[index])
+        return mantissas, exponents
+
+    def extend_records(self, records: list) -> int:
+        """Validates and appends a whole batch of API records at once, column by column.
+        Accepts exactly the same records, in the same order, as add_record would. Returns how many were accepted."""
+        if METRICS.enabled:
+            start = time.perf_counter()
+            accepted = self._extend_records(records)
+            METRICS.since("ingest_batch_seconds", start)
+            METRICS.count("ingest_records_total", len(records))
+            METRICS.count("ingest_accepted_total", accepted)
+            return accepted
+        return self._extend_records(records)
+
+    def _extend_records(self, records: list) -> int:
+        columns = [list(map(operator.itemgetter(field), records)) for field in BodyCatalog.RECORD_FIELDS]
+        masses = columns[3]
+        columns[3] = [None if mass is None else mass["massValue"] for mass in masses]
+        columns.append([None if mass is None else mass["massExponent"] for mass in masses])
+        ids = [record.get("id") or "" for record in records]
+        parents = [(record.get("aroundPlanet") or {}).get("planet") or "" for record in records]
+
+        # masks out every record with a missing field, a mass that is 0, or a name without a recognizable English
+        # name. Columns without a single missing value are skipped entirely, which is the usual case.
+        mask = bytearray(b"\x01") * len(records)
+        for column in columns:
+            if None in column:
+                for index in itertools.compress(range(len(column)), map(operator.is_, column, itertools.repeat(None))):
+                    mask[index] = 0
+        for index in [index for index, name in enumerate(columns[0]) if mask[index] and "S/" in name]:
+            mask[index] = 0
+        for index in [index for index, value in enumerate(columns[3]) if mask[index] and value <= 0]:
+            mask[index] = 0
+
+        columns += [ids, parents]
+        if mask.count(0):
+            columns = [list(itertools.compress(column, mask)) for column in columns]
+        names, semimajor, eccentricity, values, gravity, radius, body_types, exponents, ids, parents = columns
+        if not names:
+            return 0
+
+        mantissas, exponents = BodyCatalog._normalize_masses(values, exponents)
+        self._extend_columns([name.lstrip("0123456789 ") for name in names], semimajor, eccentricity, mantissas,
+                             exponents, gravity, radius, body_types, ids, parents)
+        return len(names)
+
+    def _extend_columns(self, names, semimajor, eccentricity, mantissas, exponents, gravity, radius, body_types,
+                        ids, parents) -> None:
+        """Appends already validated and normalized columns, with the body types given by name."""
+        type_lookup = self._type_lookup
+        for body_type in dict.fromkeys(body_types):
+            if body_type not in type_lookup:
+                type_lookup[body_type] = len(self._type_names)
+                self._type_names.append(body_type)
+
+        self._names.extend(names)
+        self._semimajor.extend(semimajor)
+        self._eccentricity.extend(eccentricity)
+        self._mass_value.extend(mantissas)
+        self._mass_exponent.extend(exponents)
+        self._gravity.extend(gravity)
+        self._radius.extend(radius)
+        self._type.extend(map(type_lookup.__getitem__, body_types))
+        self._ids.extend(ids)
+        self._parents.extend(parents)
+        integral = bytearray(len(names))
+        for bit, column in enumerate((semimajor, eccentricity, mantissas, gravity, radius)):
+            for index in [index for index, value in enumerate(column) if type(value) is int]:
+                integral[index] |= 1 << bit
+        self._integral.frombytes(integral)
+        self._changed()
+
+    @classmethod
+    def from_records(cls, records, batch_size: int = 1 << 14) -> "BodyCatalog":
+        """Builds a catalog from any iterable of API records. Records are validated in batches, so a streamed
+        iterable never has more than one batch in memory at a time."""
+        catalog = cls()
+        records = iter(records)
+        batch = list(itertools.islice(records, batch_size))
+        while batch:
+            catalog.extend_records(batch)
+            batch = list(itertools.islice(records, batch_size))
+
+        # the derived characteristics need every body (a moon's planet may come after it), so they are built last.
+        catalog._derive()
+        return catalog
+
+    @classmethod
+    def from_solar_system(cls, solar_system: dict) -> "BodyCatalog":
+        """Builds a catalog from the parsed JSON response of the API."""
+        return cls.from_records(solar_system["bodies"])
+
+    def write_snapshot(self, path: Path) -> None:
+        """Writes the catalog to a compact binary snapshot that from_snapshot can memory-map."""
+        name_offsets, name_blob = StringColumn.encode(self._names)
+        id_offsets, id_blob = StringColumn.encode(self._ids)
+        parent_offsets, parent_blob = StringColumn.encode(self._parents)
+        sections = [self._semimajor, self._eccentricity, self._mass_value, self._gravity, self._radius,
+                    self._mass_exponent, self._type, name_offsets, name_blob,
+                    "\n".join(self._type_names).encode("utf-8"), id_offsets, id_blob, parent_offsets, parent_blob,
+                    self._integral]
+        sections.extend(self.column(characteristic) for characteristic in BodyCatalog.DERIVED)
+        sections.extend(self.sort_keys(characteristic) for characteristic in BodyCatalog.UNITS)
+
+        body = bytearray()
+        for section in sections:
+            data = section.tobytes() if isinstance(section, array) else bytes(section)
+            body += BodyCatalog.SNAPSHOT_SECTION.pack(len(data))
+            body += data
+            body += bytes(-len(data) % 8)
+
+        header = BodyCatalog.SNAPSHOT_HEADER.pack(BodyCatalog.SNAPSHOT_MAGIC, BodyCatalog.SNAPSHOT_VERSION, 0,
+                                                  len(self), zlib.crc32(body))
+        temporary = Path(path).with_suffix(".tmp")
+        with open(temporary, "wb") as snapshot_file:
+            snapshot_file.write(header)
+            snapshot_file.write(body)
+        os.replace(temporary, path)
+
+    @classmethod
+    def from_snapshot(cls, path: Path, verify: bool = True) -> "BodyCatalog":
+        """Memory-maps a snapshot written by write_snapshot. The columns are views straight into the mapped pages, so
+        no JSON is parsed, nothing is filtered or normalized again, and processes share the same pages.
+        The resulting catalog is read-only."""
+        with open(path, "rb") as snapshot_file:
+            mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_size = BodyCatalog.SNAPSHOT_HEADER.size
+        if len(mapped) < header_size:
+            raise ValueError(f"BodyCatalog.from_snapshot: {path} is too small to be a snapshot.")
+        magic, version, _, count, checksum = BodyCatalog.SNAPSHOT_HEADER.unpack_from(mapped)
+        if magic != BodyCatalog.SNAPSHOT_MAGIC:
+            raise ValueError(f"BodyCatalog.from_snapshot: {path} is not a catalog snapshot.")
+        if version != BodyCatalog.SNAPSHOT_VERSION:
+            raise ValueError(f"BodyCatalog.from_snapshot: {path} has version {version}, "
+                             f"expected {BodyCatalog.SNAPSHOT_VERSION}.")
+
+        memory = memoryview(mapped)
+        if verify and zlib.crc32(memory[header_size:]) != checksum:
+            raise ValueError(f"BodyCatalog.from_snapshot: {path} is corrupted (checksum mismatch).")
+
+        sections = list()
+        offset = header_size
+        while offset < len(mapped):
+            (length,) = BodyCatalog.SNAPSHOT_SECTION.unpack_from(mapped, offset)
+            offset += BodyCatalog.SNAPSHOT_SECTION.size
+            sections.append(memory[offset:offset + length])
+            offset += length + (-length % 8)
+
+        catalog = cls()
+        (catalog._semimajor, catalog._eccentricity, catalog._mass_value, catalog._gravity,
+         catalog._radius) = (section.cast("d") for section in sections[:5])
+        catalog._mass_exponent = sections[5].cast("h")
+        catalog._type = sections[6]
+        catalog._names = StringColumn(sections[7].cast("I"), sections[8])
+        catalog._type_names = bytes(sections[9]).decode("utf-8").split("\n") if count else list()
+        catalog._type_lookup = {name: index for index, name in enumerate(catalog._type_names)}
+        catalog._ids = StringColumn(sections[10].cast("I"), sections[11])
+        catalog._parents = StringColumn(sections[12].cast("I"), sections[13])
+        catalog._integral = sections[14]
+        derived_end = 15 + len(BodyCatalog.DERIVED)
+        catalog._derived = {characteristic: section.cast("d")
+                            for characteristic, section in zip(BodyCatalog.DERIVED, sections[15:derived_end])}
+        catalog._keys = {characteristic: section.cast("I")
+                         for characteristic, section in zip(BodyCatalog.UNITS, sections[derived_end:])}
+        catalog._snapshot = mapped
+
+        if len(catalog) != count:
+            raise ValueError(f"BodyCatalog.from_snapshot: {path} should hold {count} bodies, not {len(catalog)}.")
+        return catalog
+
+    def view(self, index: int) -> BodyView:
+        """Returns a lightweight view of the body at the given index."""
+        if not 0 <= index < len(self._names):
+            raise IndexError(f"BodyCatalog.view: there is no body at index {index}.")
+        return BodyView(self, index)
+
+    def views(self):
+        """Yields a view for every body in the catalog."""
+        for index in range(len(self._names)):
+            yield BodyView(self, index)
+
+    def display_value(self, index: int, characteristic: str) -> str:
+        """Returns the value of the body at the given index formatted for display, from the cache when it was recently
+        shown."""
+        key = index, characteristic
+        with self._lock:
+            value = self._display.pop(key, None)
+            if value is None:
+                value = self._format_value(index, characteristic)
+                if len(self._display) >= BodyCatalog.DISPLAY_CACHE_SIZE:
+                    del self._display[next(iter(self._display))]
+            self._display[key] = value
+        return value
+
+    def _format_value(self, index: int, characteristic: str) -> str:
+        """Returns the value of the body at the given index formatted the same way its getter displays it."""
+        if characteristic == "Mass":
+            return f"{self._typed(self._mass_value, index, 2)} x 10^{self._mass_exponent[index]}"
+        if characteristic in BodyCatalog.INTEGRAL:
+            return str(self._typed(self.column(characteristic), index, BodyCatalog.INTEGRAL.index(characteristic)))
+        value = self.column(characteristic)[index]
+        return str(BodyCatalog._restore(value) if characteristic in ("Perihelion", "Aphelion") else value)
+
+    def _derive(self) -> None:
+        """Builds every derived column in one pass over the stored columns: the perihelion and aphelion distances, the
+        density, the escape velocity, and the orbital period from Kepler's third law (around the moon's planet, or
+        the Sun for everything else). Values are rounded like the API's own, and a value that cannot be derived is 0,
+        so that body is never drawn for it."""
+        pi, sqrt, g = math.pi, math.sqrt, GRAVITATIONAL_CONSTANT
+        semimajor, eccentricity, radius = self._semimajor, self._eccentricity, self._radius
+        masses = [value * 10.0 ** exponent for value, exponent in zip(self._mass_value, self._mass_exponent)]
+
+        # the mass of whatever each body orbits, or 0 if the planet of a moon is not in the catalog.
+        lookup = self._ids_lookup()
+        central = [SUN_MASS if not parent else masses[lookup[parent]] if parent in lookup else 0.0
+                   for parent in self._parents]
+
+        self._derived = {
+            "Perihelion": array("d", [round(axis * (1 - value)) for axis, value in zip(semimajor, eccentricity)]),
+            "Aphelion": array("d", [round(axis * (1 + value)) for axis, value in zip(semimajor, eccentricity)]),
+            # kg/m^3 is divided by 1000 for g/cm^3, and the radius is in km.
+            "Density": array("d", [round(mass / (4 / 3 * pi * (size * 1000) ** 3) / 1000, 3) if size > 0 else 0.0
+                                   for mass, size in zip(masses, radius)]),
+            "Escape Velocity": array("d", [round(sqrt(2 * g * mass / (size * 1000)), 2) if size > 0 else 0.0
+                                           for mass, size in zip(masses, radius)]),
+            # the period is in days, and the semimajor axis is in km.
+            "Orbital Period": array("d", [round(2 * pi * sqrt((axis * 1000) ** 3 / (g * mass)) / 86400, 3)
+                                          if axis > 0 and mass > 0 else 0.0
+                                          for axis, mass in zip(semimajor, central)]),
+        }
+
+    def fingerprint(self) -> int:
+        """Returns a crc32 over every stored column, name, id and parent, in order. Two catalogs with the same
+        fingerprint deal the same games from the same seed, whether they were built from records or a snapshot."""
+        fingerprint = self._fingerprint
+        if fingerprint is None:
+            with self._lock:
+                fingerprint = self._fingerprint
+                if fingerprint is None:
+                    fingerprint = 0
+                    for column in (self._semimajor, self._eccentricity, self._mass_value, self._gravity, self._radius,
+                                   self._mass_exponent, self._type):
+                        fingerprint = zlib.crc32(column, fingerprint)
+                    fingerprint = zlib.crc32("\n".join(self._type_names).encode("utf-8"), fingerprint)
+                    for strings in (self._names, self._ids, self._parents):
+                        for part in StringColumn.encode(strings):
+                            fingerprint = zlib.crc32(part, fingerprint)
+                    self._fingerprint = fingerprint
+        return fingerprint
+
+    def get_id(self, index: int) -> str:
+        return self._ids[index]
+
+    def index_of(self, body_id: str) -> int | None:
+        """Returns the index of the body with the given id or key (see _ids_lookup), or None if the catalog does not
+        have it. Bodies without an id are also looked up by their name, which finds the first of them."""
+        lookup = self._ids_lookup()
+        index = lookup.get(body_id)
+        return lookup.get((body_id, 0)) if index is None else index
+
+    def _ids_lookup(self) -> dict:
+        """Returns the position of every body by its key: its id, or (name, occurrence) for a body without one, so that
+        bodies without an id that share a name are still told apart."""
+        lookup = self._id_lookup
+        if lookup is None:
+            with self._lock:
+                lookup = self._id_lookup
+                if lookup is None:
+                    lookup, occurrences = dict(), dict()
+                    for index, (body_id, name) in enumerate(zip(self._ids, self._names)):
+                        if not body_id:
+                            occurrences[name] = occurrences.get(name, -1) + 1
+                            body_id = name, occurrences[name]
+                        lookup[body_id] = index
+                    self._id_lookup = lookup
+        return lookup
+
+    def row(self, index: int) -> tuple:
+        """Returns every stored value of a body, in the order append takes them."""
+        typed = self._typed
+        return (self._names[index], typed(self._semimajor, index, 0), typed(self._eccentricity, index, 1),
+                typed(self._mass_value, index, 2), self._mass_exponent[index], typed(self._gravity, index, 3),
+                typed(self._radius, index, 4),
+                self._type_names[self._type[index]], self._ids[index], self._parents[index])
+
+    def record(self, index: int) -> dict:
+        """Returns the body at the given index as an API record, which add_record accepts back unchanged."""
+        name, semimajor, eccentricity, mass_value, mass_exponent, gravity, radius, body_type, body_id, parent = \
+            self.row(index)
+        return {"id": body_id or None, "englishName": name, "semimajorAxis": semimajor, "eccentricity": eccentricity,
+                "mass": {"massValue": mass_value, "massExponent": mass_exponent}, "gravity": gravity,
+                "meanRadius": radius, "bodyType": body_type, "aroundPlanet": {"planet": parent} if parent else None}
+
+    def diff(self, newer: "BodyCatalog") -> tuple:
+        """Compares the catalog with a newer version of it by body key (see _ids_lookup), and returns the lists of keys
+        that were added, changed and removed."""
+        old, new = self._ids_lookup(), newer._ids_lookup()
+        added = [body_id for body_id in new if body_id not in old]
+        removed = [body_id for body_id in old if body_id not in new]
+        changed = [body_id for body_id, index in new.items()
+                   if body_id in old and self.row(old[body_id]) != newer.row(index)]
+        return added, changed, removed
+
+    def patched(self, newer: "BodyCatalog", added: list, changed: list, removed: list) -> "BodyCatalog":
+        """Returns a new catalog with only the given differences (see diff) taken from the newer catalog. Unchanged
+        bodies are copied column by column, changed bodies keep their place, and added bodies go at the end.
+        This catalog is left untouched, so anyone still using it is not affected."""
+        old, new = self._ids_lookup(), newer._ids_lookup()
+        keep = bytearray(b"\x01") * len(self)
+        for body_id in removed:
+            keep[old[body_id]] = 0
+
+        columns = [list(itertools.compress(column, keep)) for column in
+                   (self._names, self._semimajor, self._eccentricity, self._mass_value, self._mass_exponent,
+                    self._gravity, self._radius, self._type, self._ids, self._parents)]
+        columns[7] = [self._type_names[body_type] for body_type in columns[7]]
+        # puts back the int-ness of the kept values, which _extend_columns stores again.
+        integral = list(itertools.compress(self._integral, keep))
+        for bit, column in zip(range(5), (columns[1], columns[2], columns[3], columns[5], columns[6])):
+            for position in [position for position, flags in enumerate(integral) if flags >> bit & 1]:
+                column[position] = int(column[position])
+
+        # the position of a changed body moves up by the number of removed bodies before it.
+        position, previous = 0, 0
+        for index, body_id in sorted((old[body_id], body_id) for body_id in changed):
+            position += keep[previous:index].count(1)
+            previous = index
+            for column, value in zip(columns, newer.row(new[body_id])):
+                column[position] = value
+
+        for body_id in added:
+            for column, value in zip(columns, newer.row(new[body_id])):
+                column.append(value)
+
+        catalog = BodyCatalog()
+        catalog._extend_columns(*columns)
+        catalog._derive()
+        return catalog
+
+    def column(self, characteristic: str):
+        """Returns the raw column backing a characteristic. Mass returns the mantissa column."""
+        if characteristic in BodyCatalog.DERIVED:
+            if not self._derived:
+                with self._lock:
+                    if not self._derived:
+                        self._derive()
+            return self._derived[characteristic]
+        return {"Semimajor Axis": self._semimajor, "Eccentricity": self._eccentricity, "Mass": self._mass_value,
+                "Gravity": self._gravity, "Radius": self._radius}[characteristic]
+
+    def valid_indices(self, characteristic: str) -> array:
+        """Returns the indices of every body with a non-zero value for the characteristic.
+        The API had some values set to 0 which makes the game trivial, so those bodies are never drawn."""
+        indices = self._valid.get(characteristic)
+        if indices is None:
+            with self._lock:
+                indices = self._valid.get(characteristic)
+                if indices is None:
+                    column = self.column(characteristic)
+                    indices = self._valid[characteristic] = array("l", (index for index, value in enumerate(column)
+                                                                        if value != 0))
+        return indices
+
+    def _groups(self, column) -> dict:
+        """Returns the indices of the bodies sharing each value of a column."""
+        groups = dict()
+        for index, value in enumerate(column):
+            groups.setdefault(value, array("l")).append(index)
+        return groups
+
+    def of_type(self, body_type: str) -> array:
+        """Returns the indices of every body of the given type (e.g. 'Moon'), in catalog order."""
+        by_type = self._by_type
+        if by_type is None:
+            with self._lock:
+                by_type = self._by_type
+                if by_type is None:
+                    groups = self._groups(self._type)
+                    by_type = self._by_type = {name: groups.get(type_index, array("l"))
+                                               for type_index, name in enumerate(self._type_names)}
+        return by_type.get(body_type, array("l"))
+
+    def orbiting(self, planet: str) -> array:
+        """Returns the indices of every body that orbits the given planet, by its API id or by its name, in catalog
+        order."""
+        by_parent = self._by_parent
+        if by_parent is None:
+            with self._lock:
+                by_parent = self._by_parent
+                if by_parent is None:
+                    groups = self._groups(self._parents)
+                    groups.pop("", None)
+                    by_parent = self._by_parent = groups
+        return by_parent.get(self._planet_id(planet), array("l"))
+
+    def _planet_id(self, planet: str) -> str:
+        """Returns the API id of a planet given by its id or by its name (ignoring case)."""
+        if self.index_of(planet) is not None:
+            return planet
+        # names are looked up in the name index, and then the body's id is used instead.
+        matches = [index for index in self.with_prefix(planet) if self._names[index].lower() == planet.lower()]
+        return self._ids[matches[0]] or planet if matches else planet
+
+    def with_prefix(self, prefix: str) -> array:
+        """Returns the indices of every body whose name starts with the prefix (ignoring case), in O(log n) plus the
+        number of matches, in name order."""
+        name_order = self._name_order
+        if name_order is None:
+            with self._lock:
+                name_order = self._name_order
+                if name_order is None:
+                    names = [name.lower() for name in self._names]
+                    order = array("l", sorted(range(len(names)), key=names.__getitem__))
+                    name_order = self._name_order = (order, [names[index] for index in order])
+        order, names = name_order
+        prefix = prefix.lower()
+        return order[bisect.bisect_left(names, prefix):bisect.bisect_left(names, prefix + chr(0x10FFFF))]
+
+    def _sorted_values(self, characteristic: str) -> tuple:
+        """Returns the indices of every body sorted by its value for the characteristic, together with the sorted
+        values themselves. Mass is in kg."""
+        ordered = self._sorted.get(characteristic)
+        if ordered is None:
+            with self._lock:
+                ordered = self._sorted.get(characteristic)
+                if ordered is None:
+                    values = self._values(characteristic)
+                    order = sorted(range(len(values)), key=values.__getitem__)
+                    ordered = self._sorted[characteristic] = (array("l", order),
+                                                              array("d", map(values.__getitem__, order)))
+        return ordered
+
+    def _values(self, characteristic: str):
+        """Returns every body's value for the characteristic as plain numbers. Mass is in kg."""
+        if characteristic == "Mass":
+            return [value * 10.0 ** exponent for value, exponent in zip(self._mass_value, self._mass_exponent)]
+        return self.column(characteristic)
+
+    def _within(self, characteristic: str, low: float | None, high: float | None):
+        """Returns a test for whether a single body's value is within [low, high], like between."""
+        low = -math.inf if low is None else low
+        high = math.inf if high is None else high
+        if characteristic == "Mass":
+            values, exponents = self._mass_value, self._mass_exponent
+            return lambda index: low <= values[index] * 10.0 ** exponents[index] <= high
+        column = self.column(characteristic)
+        return lambda index: low <= column[index] <= high
+
+    def between(self, characteristic: str, low: float | None = None, high: float | None = None) -> array:
+        """Returns the indices of every body whose value for the characteristic is within [low, high] (either end
+        may be None for no bound), in O(log n) plus the number of matches, in value order."""
+        if characteristic not in BodyCatalog.UNITS:
+            raise ValueError(f"BodyCatalog.between: unknown characteristic {characteristic!r}.")
+        order, values = self._sorted_values(characteristic)
+        start = 0 if low is None else bisect.bisect_left(values, low)
+        end = len(values) if high is None else bisect.bisect_right(values, high)
+        return order[start:end]
+
+    def search(self, body_type: str | None = None, prefix: str | None = None, around: str | None = None,
+               ranges: dict | None = None) -> array:
+        """Returns the indices of every body matching all of the given filters, in catalog order: its type, a name
+        prefix, the planet it orbits, and {characteristic: (low, high)} ranges as in between. Only the most
+        selective filter is looked up in its index, and its matches are checked against the others, so a query
+        costs about as much as its smallest filter. The result can be handed to GameEngine.new_game as a pool."""
+        # every filter is its index's matches and a test for a single body.
+        filters = list()
+        if body_type is not None:
+            type_index = self._type_lookup.get(body_type)
+            filters.append((self.of_type(body_type), lambda index: self._type[index] == type_index))
+        if prefix is not None:
+            lowered = prefix.lower()
+            filters.append((self.with_prefix(prefix), lambda index: self._names[index].lower().startswith(lowered)))
+        if around is not None:
+            planet = self._planet_id(around)
+            filters.append((self.orbiting(planet), lambda index: self._parents[index] == planet))
+        for characteristic, (low, high) in (ranges or dict()).items():
+            filters.append((self.between(characteristic, low, high), self._within(characteristic, low, high)))
+        if not filters:
+            return array("l", range(len(self)))
+
+        filters.sort(key=lambda entry: len(entry[0]))
+        (smallest, _), tests = filters[0], [test for _, test in filters[1:]]
+        return array("l", sorted(index for index in smallest if all(test(index) for test in tests)))
+
+    def sort_keys(self, characteristic: str) -> array:
+        """Returns one orderable key per body for the characteristic: the dense rank of its value, so equal values
+        share a key. Mass is ranked by exponent first and then by mantissa, like HigherLower._check_answer.
+        The keys are computed once per catalog (and stored in snapshots), so judging an answer is one comparison."""
+        keys = self._keys.get(characteristic)
+        if keys is None:
+            with self._lock:
+                keys = self._keys.get(characteristic)
+                if keys is None:
+                    keys = self._keys[characteristic] = self._rank(characteristic)
+        return keys
+
+    def _rank(self, characteristic: str) -> array:
+        """Returns the dense rank of every body's value for the characteristic (see sort_keys)."""
+        if characteristic == "Mass":
+            values = list(zip(self._mass_exponent, self._mass_value))
+        else:
+            values = list(self.column(characteristic))
+
+        keys = array("I", bytes(4 * len(values)))
+        rank, previous = -1, None
+        for index in sorted(range(len(values)), key=values.__getitem__):
+            if rank < 0 or values[index] != previous:
+                rank, previous = rank + 1, values[index]
+            keys[index] = rank
+        return keys
+
+    def judge(self, left: int, right: int, characteristic: str, answer: str) -> tuple:
+        """Returns whether the answer is correct and whether it was a free point for the bodies at the given indices.
+        Equal values always count as correct, but only characteristics other than mass announce a free point."""
+        keys = self.sort_keys(characteristic)
+        left_key, right_key = keys[left], keys[right]
+        if left_key == right_key:
+            return True, characteristic != "Mass"
+        return (left_key < right_key) == (answer == "HIGHER"), False
+
+    def judge_many(self, characteristic: str, triples) -> list:
+        """Scores many (left index, right index, answer) triples for one characteristic at once, for replays and bots.
+        Returns whether each answer was correct."""
+        keys = self.sort_keys(characteristic)
+        return [keys[left] == keys[right] or (keys[left] < keys[right]) == (answer == "HIGHER")
+                for left, right, answer in triples]
+
+    def log_order(self, characteristic: str) -> tuple:
+        """Returns the indices of every body with a positive value for the characteristic, sorted by the log10 of that
+        value, together with the sorted log10 values themselves. Mass uses its exponent plus the log10 of its mantissa.
+        Both arrays are linear in the size of the catalog and are built once per characteristic."""
+        order = self._log_order.get(characteristic)
+        if order is None:
+            with self._lock:
+                order = self._log_order.get(characteristic)
+                if order is None:
+                    order = self._log_order[characteristic] = self.log_order_within(characteristic,
+                                                                                    range(len(self)))
+        return order
+
+    def log_order_within(self, characteristic: str, indices) -> tuple:
+        """Returns the same as log_order, but only for the given bodies (e.g. the pool of a game), without caching."""
+        if characteristic == "Mass":
+            values, exponents = self._mass_value, self._mass_exponent
+            logs = [(index, exponents[index] + math.log10(values[index])) for index in indices if values[index] > 0]
+        else:
+            column = self.column(characteristic)
+            logs = [(index, math.log10(column[index])) for index in indices if column[index] > 0]
+        logs.sort(key=operator.itemgetter(1))
+        return array("l", map(operator.itemgetter(0), logs)), array("d", map(operator.itemgetter(1), logs))
+
+    def draw_within(self, left: int, characteristic: str, low: float, high: float, rng,
+                    order: tuple | None = None) -> int | None:
+        """Returns a random body whose value is between low and high orders of magnitude away from the left body's
+        value (in either direction), in O(log n). Returns None if there is no such body. The body is drawn from the
+        given log order (see log_order_within), or from the whole catalog."""
+        order, logs = self.log_order(characteristic) if order is None else order
+        if characteristic == "Mass":
+            value = self._mass_value[left]
+            center = self._mass_exponent[left] + math.log10(value) if value > 0 else None
+        else:
+            value = self.column(characteristic)[left]
+            center = math.log10(value) if value > 0 else None
+        if center is None:
+            return None
+
+        # one band lies above the left body's value and one below, each a contiguous run of the sorted logs.
+        above = bisect.bisect_left(logs, center + low), bisect.bisect_right(logs, center + high)
+        below = bisect.bisect_left(logs, center - high), bisect.bisect_right(logs, center - low)
+        if low <= 0:
+            # both bands contain the left body's own value, so the runs are merged to count it only once.
+            above, below = (below[0], above[1]), (0, 0)
+
+        above_count, below_count = max(0, above[1] - above[0]), max(0, below[1] - below[0])
+        if not above_count + below_count:
+            return None
+        position = rng.randrange(above_count + below_count)
+        return order[above[0] + position if position < above_count else below[0] + position - above_count]
+
+    @staticmethod
+    def get_units(characteristic: str) -> str:
+        return BodyCatalog.UNITS[characteristic]
+
+
+class CatalogStore:
+    """Publishes immutable versions of a catalog. A new payload is diffed against the current version by body id, and
+    only the added, changed and removed bodies are applied to a new version, which then replaces the current one in a
+    single step. Games that already started keep the version they started with, and new games use the newest."""
+    def __init__(self, catalog: BodyCatalog):
+        self._catalog = catalog
+        self._version = 1
+        self._lock = threading.Lock()           # keeps two updates from diffing against the same version.
+
+    def current(self) -> BodyCatalog:
+        return self._catalog
+
+    def get_version(self) -> int:
+        return self._version
+
+    def update(self, records) -> tuple:
+        """Applies a new payload of API records. Returns the lists of body keys (see BodyCatalog.diff) that were added,
+        changed and removed."""
+        newer = BodyCatalog.from_records(records)
+        with self._lock:
+            current = self._catalog
+            added, changed, removed = current.diff(newer)
+            if added or changed or removed:
+                catalog = current.patched(newer, added, changed, removed)
+                if not len(catalog):
+                    raise ValueError("CatalogStore.update: the new payload does not have any valid bodies.")
+                self._catalog = catalog
+                self._version += 1
+        return added, changed, removed
+
+
+class BodySampler:
+    """Draws random bodies for a game without copying anything from the catalog. Every characteristic draws from the
+    catalog's shared array of valid bodies, and the sampler only keeps the small set of bodies that are currently out
+    of play (at most the two bodies of a round), so any number of games can share one catalog across threads.
+    A game restricted to a pool of bodies (see BodyCatalog.search) keeps its own, pool-sized arrays instead."""
+    REJECTIONS = 8
+
+    def __init__(self, catalog: BodyCatalog, characteristics: list, rng=random, pool=None):
+        self._catalog = catalog
+        self._rng = rng
+        self._characteristics = tuple(characteristics)
+        self._drawn = set()                     # indices of the bodies that are out of play.
+
+        # the valid bodies of every characteristic within the pool, or None to use the whole catalog, and the log order
+        # of the pool's bodies for every characteristic that adaptive rounds have drawn from.
+        self._pool = None
+        self._log_orders = dict()
+        if pool is not None:
+            self._pool = {characteristic: array("l", (index for index in pool
+                                                      if catalog.column(characteristic)[index] != 0))
+                          for characteristic in self._characteristics}
+
+    def _valid(self, characteristic: str) -> array:
+        """Returns the bodies that may be drawn for the characteristic when none are out of play."""
+        if self._pool is None:
+            return self._catalog.valid_indices(characteristic)
+        return self._pool[characteristic]
+
+    def __len__(self) -> int:
+        return len(self._catalog)
+
+    def available(self, characteristic: str) -> int:
+        """Returns how many bodies can currently be drawn for the characteristic."""
+        column = self._catalog.column(characteristic)
+        return len(self._valid(characteristic)) - sum(column[index] != 0 for index in self._drawn)
+
+    def draw(self, characteristic: str) -> BodyView:
+        """Removes and returns a random body with a non-zero value for the characteristic."""
+        valid = self._valid(characteristic)
+        if not self.available(characteristic):
+            raise ValueError(f"BodySampler.draw: there are no bodies left with a non-zero {characteristic.lower()}.")
+
+        # a few bodies are out of play at most, so redrawing almost always succeeds right away.
+        for _ in range(BodySampler.REJECTIONS):
+            index = valid[self._rng.randrange(len(valid))]
+            if index not in self._drawn:
+                break
+        else:
+            # nearly every valid body is out of play, so the few that are left are listed instead.
+            remaining = [index for index in valid if index not in self._drawn]
+            index = remaining[self._rng.randrange(len(remaining))]
+
+        self._drawn.add(index)
+        return BodyView(self._catalog, index)
+
+    def take(self, index: int, characteristic: str) -> BodyView | None:
+        """Removes and returns a specific body if it can currently be drawn for the characteristic, otherwise None."""
+        if index in self._drawn or self._catalog.column(characteristic)[index] == 0:
+            return None
+        if self._pool is not None and not BodySampler._contains(self._pool[characteristic], index):
+            return None
+        self._drawn.add(index)
+        return BodyView(self._catalog, index)
+
+    def draw_within(self, left: int, characteristic: str, low: float, high: float) -> int | None:
+        """Returns a random body within the difficulty band around the left body, like BodyCatalog.draw_within, but
+        only from the pool if there is one. The body is not removed; see take."""
+        if self._pool is None:
+            return self._catalog.draw_within(left, characteristic, low, high, self._rng)
+        order = self._log_orders.get(characteristic)
+        if order is None:
+            order = self._log_orders[characteristic] = self._catalog.log_order_within(characteristic,
+                                                                                     self._pool[characteristic])
+        return self._catalog.draw_within(left, characteristic, low, high, self._rng, order)
+
+    def put_back(self, body: BodyView) -> None:
+        """Readmits a previously drawn body into play."""
+        self._drawn.discard(body.get_index())
+
+    @staticmethod
+    def _contains(indices: array, index: int) -> bool:
+        """Returns whether a sorted array of indices contains the index."""
+        position = bisect.bisect_left(indices, index)
+        return position < len(indices) and indices[position] == index
+
+
+class Round:
+    """A single round of the game: the left body, the right body, and the characteristic they are compared on."""
+    __slots__ = ("_number", "_left", "_right", "_characteristic")
+
+    def __init__(self, number: int, left: BodyView, right: BodyView, characteristic: str):
+        self._number = number                   # round index, starting at 0.
+        self._left = left                       # body whose value is shown to the player.
+        self._right = right                     # body the player has to guess about.
+        self._characteristic = characteristic   # characteristic being compared.
 
-        # stores all the solar system bodies.
-        self._bodies = list()
+    def get_number(self) -> int:
+        return self._number
 
-        # stores useful information to make this a game, such as current score and whether the player has not lost.
+    def get_left(self) -> BodyView:
+        return self._left
+
+    def get_right(self) -> BodyView:
+        return self._right
+
+    def get_characteristic(self) -> str:
+        return self._characteristic
+
+
+class RoundResult:
+    """The outcome of submitting an answer for a Round."""
+    __slots__ = ("_round", "_answer", "_correct", "_free_point", "_score", "_alive")
+
+    def __init__(self, played_round: Round, answer: str, correct: bool, free_point: bool, score: int, alive: bool):
+        self._round = played_round              # the round that was answered.
+        self._answer = answer                   # 'HIGHER' or 'LOWER'.
+        self._correct = correct                 # whether the answer was right.
+        self._free_point = free_point           # whether both bodies had the same value.
+        self._score = score                     # score after the answer.
+        self._alive = alive                     # whether the game continues.
+
+    def get_round(self) -> Round:
+        return self._round
+
+    def get_answer(self) -> str:
+        return self._answer
+
+    def is_correct(self) -> bool:
+        return self._correct
+
+    def is_free_point(self) -> bool:
+        return self._free_point
+
+    def get_score(self) -> int:
+        return self._score
+
+    def is_alive(self) -> bool:
+        return self._alive
+
+
+class GameEngine:
+    """Headless higher-lower game. It never reads input, prints, or sleeps, so any front end (the shell, a server,
+    a bot, or a test) can drive it as fast as it wants."""
+    ANSWERS = ("HIGHER", "LOWER")
+
+    # adaptive games draw opponents whose value is between a quarter of the band and the whole band (in orders of
+    # magnitude) away from the left body. The band starts wide and shrinks with every point, down to the floor.
+    DIFFICULTY_START = 2.0
+    DIFFICULTY_DECAY = 0.9
+    DIFFICULTY_FLOOR = 0.02
+    ADAPTIVE_ATTEMPTS = 8
+
+    # seeds are within [0, SEED_LIMIT).
+    SEED_LIMIT = 1 << 64
+
+    def __init__(self, catalog: BodyCatalog | CatalogStore):
+        # with a store, every new game is played on its newest catalog.
+        self._store = catalog if isinstance(catalog, CatalogStore) else None
+        self._catalog = catalog.current() if self._store is not None else catalog
+
+        # per-game state, filled in by new_game.
+        self._categories = tuple()
+        self._adaptive = False
+        self._seed = None
+        self._rng = None
+        self._sampler = None
+        self._pool = None
+        self._score = 0
+        self._alive = False
+        self._left = None
+        self._characteristic = None
+        self._round = None
+        self._round_number = 0
+        self._answers = bytearray()
+
+    def get_catalog(self) -> BodyCatalog:
+        return self._catalog
+
+    def get_seed(self) -> int | None:
+        """Returns the seed of the current game, which reproduces it together with the settings and the answers."""
+        return self._seed
+
+    def get_answers(self) -> bytes:
+        """Returns the answers of the current game so far, one byte per round (1 for 'HIGHER', 0 for 'LOWER')."""
+        return bytes(self._answers)
+
+    def get_score(self) -> int:
+        return self._score
+
+    def is_alive(self) -> bool:
+        return self._alive
+
+    def get_categories(self) -> tuple:
+        return self._categories
+
+    def is_single(self) -> bool:
+        """Returns whether the game only has one category, in which case the category never changes."""
+        return len(self._categories) == 1
+
+    def is_adaptive(self) -> bool:
+        """Returns whether opponents are drawn from a difficulty band that tightens as the score rises."""
+        return self._adaptive
+
+    def get_pool(self) -> array | None:
+        """Returns the bodies the current game is restricted to, or None if it plays with the whole catalog."""
+        return self._pool
+
+    @staticmethod
+    def difficulty_band(score: int) -> tuple:
+        """Returns the (low, high) distance in orders of magnitude between the two bodies of an adaptive round.
+        The low end keeps equal values (free points) out of the band."""
+        high = max(GameEngine.DIFFICULTY_FLOOR, GameEngine.DIFFICULTY_START * GameEngine.DIFFICULTY_DECAY ** score)
+        return high / 4, high
+
+    def new_game(self, settings: dict | None = None, seed: int | None = None, adaptive: bool = False,
+                 pool=None) -> None:
+        """Starts a new game. The settings map each category to whether it is enabled (all of them by default).
+        Every game owns its own RNG, so the same catalog, settings, seed and answers always play out the same way.
+        Without a seed, a random one is picked (and can be read back with get_seed).
+        An adaptive game draws each opponent from a difficulty band that tightens as the score rises.
+        A pool of body indices (e.g. from BodyCatalog.search) restricts the game to those bodies."""
+        if settings is None:
+            settings = dict.fromkeys(BodyCatalog.UNITS, True)
+
+        unknown = [category for category in settings if category not in BodyCatalog.UNITS]
+        if unknown:
+            raise ValueError(f"GameEngine.new_game: unknown categories {unknown}.")
+
+        # categories always follow the catalog's order, so that a replay does not depend on the order of the settings.
+        categories = tuple(category for category in BodyCatalog.UNITS if settings.get(category))
+        if not categories:
+            raise ValueError("GameEngine.new_game: you must have at least one category enabled.")
+        if self._store is not None:
+            self._catalog = self._store.current()
+        if len(self._catalog) < 2:
+            raise IndexError("GameEngine.new_game: You tried to play a game with less than 2 bodies!")
+        if pool is not None:
+            pool = array("l", sorted(set(pool)))
+            if len(pool) < 2:
+                raise IndexError("GameEngine.new_game: You tried to play a game with less than 2 bodies!")
+            if pool[0] < 0 or pool[-1] >= len(self._catalog):
+                raise ValueError("GameEngine.new_game: the pool has bodies that are not in the catalog.")
+
+        # the global random module is never used, so games on different threads cannot disturb each other.
+        # seeds are unsigned 64-bit numbers, which is how the replay log and the leaderboard store them.
+        if seed is None:
+            seed = int.from_bytes(os.urandom(8), "little")
+        elif not 0 <= seed < GameEngine.SEED_LIMIT:
+            raise ValueError(f"GameEngine.new_game: the seed must be within [0, 2^64), not {seed}.")
+        rng = random.Random(seed)
+        sampler = BodySampler(self._catalog, categories, rng, pool)
+        if pool is not None:
+            unplayable = [category for category in categories if sampler.available(category) < 2]
+            if unplayable:
+                raise ValueError(f"GameEngine.new_game: the pool has less than 2 bodies with a non-zero value for "
+                                 f"{unplayable}.")
+
+        self._categories = categories
+        self._adaptive = adaptive
+        self._seed = seed
+        self._rng = rng
+        self._sampler = sampler
+        self._pool = pool
         self._score = 0
         self._alive = True
-        self._match_categories = list()
+        self._left = None
+        self._characteristic = None
+        self._round = None
+        self._round_number = 0
+        self._answers = bytearray()
+
+    def next_round(self) -> Round:
+        """Draws the next comparison body and returns the round the player has to answer."""
+        if not self._alive:
+            raise RuntimeError("GameEngine.next_round: the game is over, start a new game first.")
+        if self._round is not None:
+            raise RuntimeError("GameEngine.next_round: the current round has not been answered yet.")
+
+        if METRICS.enabled:
+            start = time.perf_counter()
+
+        # the very first round chooses a random category and a random starting body.
+        if self._left is None:
+            self._characteristic = self._choose_category()
+            self._left = self._sampler.draw(self._characteristic)
+
+        right = self._draw_opponent() if self._adaptive else None
+        if right is None:
+            right = self._sampler.draw(self._characteristic)
+        self._round = Round(self._round_number, self._left, right, self._characteristic)
+
+        if METRICS.enabled:
+            METRICS.since("select_seconds", start)
+            METRICS.count("rounds_total")
+        return self._round
+
+    def submit(self, answer: str) -> RoundResult:
+        """Judges the answer for the current round and advances the game."""
+        if self._round is None:
+            raise RuntimeError("GameEngine.submit: there is no round waiting for an answer.")
+
+        answer = answer.upper().strip()
+        if answer not in GameEngine.ANSWERS:
+            raise ValueError(f"GameEngine.submit: the answer must be one of {GameEngine.ANSWERS}, not {answer!r}.")
+
+        played_round, self._round = self._round, None
+        self._answers.append(answer == "HIGHER")
+        left, right = played_round.get_left(), played_round.get_right()
+        if METRICS.enabled:
+            start = time.perf_counter()
+            correct, free_point = GameEngine.judge(left, right, played_round.get_characteristic(), answer)
+            METRICS.since("check_seconds", start)
+            METRICS.count("free_points_total", free_point)
+        else:
+            correct, free_point = GameEngine.judge(left, right, played_round.get_characteristic(), answer)
+
+        if correct:
+            # the comparison body is now the basis for the next round, and the left body can be drawn again.
+            self._score += 1
+            self._sampler.put_back(left)
+            self._left = right
+            self._characteristic = self._choose_category()
+        else:
+            # the player lost the game, so both bodies go back into the pool.
+            self._alive = False
+            self._sampler.put_back(left)
+            self._sampler.put_back(right)
+            self._left = None
+
+        self._round_number += 1
+        return RoundResult(played_round, answer, correct, free_point, self._score, self._alive)
+
+    def _draw_opponent(self) -> BodyView | None:
+        """Draws a comparison body within the difficulty band of the current score, or returns None if the band has
+        no body that can be drawn (in which case any body is drawn instead)."""
+        low, high = GameEngine.difficulty_band(self._score)
+        for attempt in range(GameEngine.ADAPTIVE_ATTEMPTS):
+            index = self._sampler.draw_within(self._left.get_index(), self._characteristic, low, high)
+            if index is None:
+                break
+            right = self._sampler.take(index, self._characteristic)
+            if right is not None:
+                if METRICS.enabled and attempt:
+                    METRICS.count("select_retries_total", attempt)
+                return right
+
+        # the band had nothing left to draw, so the caller falls back to a uniform draw.
+        if METRICS.enabled:
+            METRICS.count("select_fallbacks_total")
+        return None
+
+    def _choose_category(self) -> str:
+        """Chooses a random enabled category. With a single category, that category never changes."""
+        if len(self._categories) == 1:
+            return self._categories[0]
+        return self._categories[self._rng.randrange(len(self._categories))]
+
+    @staticmethod
+    def judge(left: BodyView, right: BodyView, characteristic: str, answer: str) -> tuple:
+        """Returns whether the answer is correct and whether it was a free point, following the same rules as
+        HigherLower._check_answer: equal values always count as correct, and mass compares the exponent first."""
+        return left._catalog.judge(left.get_index(), right.get_index(), characteristic, answer)
+
+    def replay(self, seed: int, settings: dict, answers: bytes, adaptive: bool = False, pool=None) -> int:
+        """Plays a recorded game again without any input and returns the score it reaches.
+        The answer of round i is answers[i], stored the same way as get_answers."""
+        self.new_game(settings, seed, adaptive, pool)
+        for answer in answers:
+            if not self._alive:
+                break
+            self.next_round()
+            self.submit("HIGHER" if answer else "LOWER")
+        return self._score
+
+
+class ReplayLog:
+    """Append-only binary log of finished games. Each game is stored as its seed, its settings, the score it reached
+    and its answers, so GameEngine.replay can reproduce it exactly for audits and bug reports.
+
+    Layout: a header (magic, version, reserved, number of bodies in the catalog, BodyCatalog.fingerprint of the
+    catalog) followed by one record per game.
+    A record is a fixed-size head (seed, settings bitmask, score, number of answers) followed by the answers packed
+    eight to a byte, where bit i is the answer of round i (1 for 'HIGHER', 0 for 'LOWER'). The top bit of the settings
+    bitmask marks adaptive games."""
+    MAGIC = b"SSHLRPLY"
+    VERSION = 3
+    HEADER = struct.Struct("<8sHHII")
+    RECORD = struct.Struct("<QHII")
+    ADAPTIVE = 1 << 15
+
+    def __init__(self, path: Path, catalog: BodyCatalog):
+        self._path = Path(path)
+        self._catalog = catalog
+        self._lock = threading.Lock()
+        self._checked = False                   # whether the header of an existing log was checked (see append).
+
+    @staticmethod
+    def encode_settings(settings: dict) -> int:
+        """Returns the settings as a bitmask over BodyCatalog.UNITS."""
+        return sum(1 << bit for bit, category in enumerate(BodyCatalog.UNITS) if settings.get(category))
+
+    @staticmethod
+    def decode_settings(mask: int) -> dict:
+        """Returns the settings stored in a bitmask by encode_settings."""
+        return {category: bool(mask >> bit & 1) for bit, category in enumerate(BodyCatalog.UNITS)}
+
+    def append(self, seed: int, settings: dict, score: int, answers: bytes, adaptive: bool = False) -> None:
+        """Appends a single finished game to the log, writing the header first if the log is new."""
+        packed = bytearray((len(answers) + 7) // 8)
+        for index, answer in enumerate(answers):
+            if answer:
+                packed[index >> 3] |= 1 << (index & 7)
+        mask = ReplayLog.encode_settings(settings) | (ReplayLog.ADAPTIVE if adaptive else 0)
+        if not 0 <= seed < GameEngine.SEED_LIMIT:
+            raise ValueError(f"ReplayLog.append: the seed must be within [0, 2^64), not {seed}.")
+        record = ReplayLog.RECORD.pack(seed, mask, score, len(answers)) + bytes(packed)
+
+        with self._lock, open(self._path, "ab") as log_file:
+            if log_file.tell() == 0:
+                log_file.write(ReplayLog.HEADER.pack(ReplayLog.MAGIC, ReplayLog.VERSION, 0, len(self._catalog),
+                                                     self._catalog.fingerprint()))
+            elif not self._checked:
+                # games of another catalog cannot be added to an existing log, since they could never be audited.
+                with open(self._path, "rb") as existing:
+                    self._check_header(existing.read(ReplayLog.HEADER.size))
+            self._checked = True
+            log_file.write(record)
+
+    def append_game(self, engine: GameEngine) -> None:
+        """Appends the game that the engine just played."""
+        if engine.get_catalog() is not self._catalog:
+            raise ValueError("ReplayLog.append_game: the game was played on a different catalog than the log's, so "
+                             "it could not be replayed from the log.")
+        if engine.get_pool() is not None:
+            raise ValueError("ReplayLog.append_game: games restricted to a pool cannot be replayed from the log.")
+        settings = dict.fromkeys(engine.get_categories(), True)
+        self.append(engine.get_seed(), settings, engine.get_score(), engine.get_answers(), engine.is_adaptive())
+
+    def __iter__(self):
+        """Yields every recorded game as (seed, settings, score, answers, adaptive)."""
+        with open(self._path, "rb") as log_file:
+            data = log_file.read()
+
+        self._check_header(data)
+        offset = ReplayLog.HEADER.size
+        while offset < len(data):
+            if offset + ReplayLog.RECORD.size > len(data):
+                raise ValueError(f"ReplayLog: {self._path} ends in the middle of a record.")
+            seed, mask, score, count = ReplayLog.RECORD.unpack_from(data, offset)
+            offset += ReplayLog.RECORD.size
+            packed = data[offset:offset + (count + 7) // 8]
+            offset += (count + 7) // 8
+            if len(packed) != (count + 7) // 8:
+                raise ValueError(f"ReplayLog: {self._path} ends in the middle of a record.")
+            answers = bytes(packed[index >> 3] >> (index & 7) & 1 for index in range(count))
+            yield seed, ReplayLog.decode_settings(mask), score, answers, bool(mask & ReplayLog.ADAPTIVE)
+
+    def _check_header(self, data: bytes) -> None:
+        """Raises a ValueError unless the data starts with the header of a log recorded on this log's catalog."""
+        if len(data) < ReplayLog.HEADER.size:
+            raise ValueError(f"ReplayLog: {self._path} is too small to be a replay log.")
+        magic, version, _, bodies, fingerprint = ReplayLog.HEADER.unpack_from(data)
+        if magic != ReplayLog.MAGIC:
+            raise ValueError(f"ReplayLog: {self._path} is not a replay log.")
+        if version != ReplayLog.VERSION:
+            raise ValueError(f"ReplayLog: {self._path} has version {version}, expected {ReplayLog.VERSION}.")
+        if bodies != len(self._catalog):
+            raise ValueError(f"ReplayLog: {self._path} was recorded with {bodies} bodies, "
+                             f"but the catalog has {len(self._catalog)}.")
+        if fingerprint != self._catalog.fingerprint():
+            raise ValueError(f"ReplayLog: {self._path} was recorded with a different catalog of the same size "
+                             f"(fingerprint {fingerprint:08x}, the catalog's is {self._catalog.fingerprint():08x}), "
+                             f"so its games cannot be replayed.")
+
+    def audit(self) -> list:
+        """Replays every recorded game and returns (game index, recorded score, replayed score) for every game whose
+        score could not be reproduced."""
+        engine = GameEngine(self._catalog)
+        mismatches = list()
+        for index, (seed, settings, score, answers, adaptive) in enumerate(self):
+            replayed = engine.replay(seed, settings, answers, adaptive)
+            if replayed != score:
+                mismatches.append((index, score, replayed))
+        return mismatches
+
+
+class QuestionBatch:
+    """Many questions generated at once and stored column by column. Question i compares the bodies lefts[i] and
+    rights[i] on every characteristic of combinations[combos[i]], and answers[k][i] is the answer for its k-th
+    characteristic: 1 if the right body is higher, -1 if it is lower, and 0 if they are equal (a free point)."""
+    def __init__(self, catalog: BodyCatalog, combinations: list, combos: array, lefts: array, rights: array,
+                 answers: list):
+        self._catalog = catalog
+        self.combinations = combinations        # tuples of characteristics that questions compare.
+        self.combos = combos                    # index into self.combinations for every question.
+        self.lefts = lefts
+        self.rights = rights
+        self.answers = answers                  # one array per characteristic position.
+
+    def __len__(self) -> int:
+        return len(self.lefts)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.question(index)
+
+    def question(self, index: int) -> tuple:
+        """Returns (left body, right body, characteristics, answers) where every answer is 'HIGHER', 'LOWER' or None
+        if either answer is correct."""
+        characteristics = self.combinations[self.combos[index]]
+        answers = tuple({1: "HIGHER", -1: "LOWER", 0: None}[self.answers[position][index]]
+                        for position in range(len(characteristics)))
+        return (BodyView(self._catalog, self.lefts[index]), BodyView(self._catalog, self.rights[index]),
+                characteristics, answers)
+
+    def check(self, index: int, answers) -> bool:
+        """Returns whether every answer ('HIGHER' or 'LOWER', one per characteristic) to a question is correct.
+        Equal values always count as correct, like in the game."""
+        return all(expected == 0 or expected == (1 if answer.upper().strip() == "HIGHER" else -1)
+                   for expected, answer in zip((column[index] for column in self.answers), answers))
+
+
+def _draw_valid(rng, pool: array, others: list, excluded: int, combination: tuple, fitting: list) -> int:
+    """Returns a random body of the pool, other than the excluded one, with a non-zero value in every other column.
+    Bodies are redrawn until one fits. If none does after a while, which only happens when very few fit, the fitting
+    bodies are listed once into `fitting` and drawn from from then on."""
+    size = len(pool)
+    if not fitting:
+        for _ in range(64):
+            index = pool[int(size * rng.random())] if size else excluded
+            if index != excluded and all(column[index] for column in others):
+                return index
+        fitting.extend(index for index in pool if all(column[index] for column in others))
+        if len(fitting) < 2:
+            raise ValueError(f"generate_questions: fewer than 2 bodies are valid for {' + '.join(combination)}.")
+
+    index = excluded
+    while index == excluded:
+        index = fitting[int(len(fitting) * rng.random())]
+    return index
+
+
+def generate_questions(catalog: BodyCatalog, count: int, characteristics=tuple(BodyCatalog.UNITS), stats: int = 1,
+                       seed: int | None = None) -> QuestionBatch:
+    """Generates a batch of questions in one call, each comparing two different bodies on `stats` distinct
+    characteristics at once. Questions are grouped by the characteristics they compare, so every group is drawn and
+    answered over whole columns (the bodies valid for one of its characteristics and its sort keys) rather than one
+    round at a time."""
+    characteristics = tuple(characteristics)
+    if not 1 <= stats <= len(characteristics):
+        raise ValueError(f"generate_questions: stats must be between 1 and {len(characteristics)}, not {stats}.")
+
+    rng = random.Random(seed)
+    combinations = list(itertools.combinations(characteristics, stats))
+    combos = array("H", rng.choices(range(len(combinations)), k=count))
+
+    lefts = array("l", [0]) * count
+    rights = array("l", [0]) * count
+    answers = [array("b", [0]) * count for _ in range(stats)]
+
+    # the questions of every combination, gathered in a single pass.
+    groups = [list() for _ in combinations]
+    for position, combo in enumerate(combos):
+        groups[combo].append(position)
+
+    for combination, positions in zip(combinations, groups):
+        if not positions:
+            continue
+
+        # bodies are drawn from the characteristic with the fewest valid bodies, and redrawn if they have a value of
+        # 0 for another characteristic of the question (or, for the right body, if it is the left body).
+        smallest = min(combination, key=lambda characteristic: len(catalog.valid_indices(characteristic)))
+        pool = catalog.valid_indices(smallest)
+        others = [catalog.column(characteristic) for characteristic in combination if characteristic != smallest]
+        fitting = list()
+        group_lefts = [_draw_valid(rng, pool, others, -1, combination, fitting) for _ in positions]
+        group_rights = [_draw_valid(rng, pool, others, left, combination, fitting) for left in group_lefts]
+        for position, left, right in zip(positions, group_lefts, group_rights):
+            lefts[position], rights[position] = left, right
+
+        for place, characteristic in enumerate(combination):
+            keys = catalog.sort_keys(characteristic)
+            column = answers[place]
+            for position, left, right in zip(positions, group_lefts, group_rights):
+                column[position] = (keys[right] > keys[left]) - (keys[right] < keys[left])
+
+    return QuestionBatch(catalog, combinations, combos, lefts, rights, answers)
+
+
+class Leaderboard:
+    """Scores of finished games in a local SQLite database (in WAL mode), keyed by settings mix and day.
+    Scores are queued and written in batches by a background thread, so recording a score never blocks a game.
+    Besides every individual score, the database keeps how many games reached each score per settings mix and day,
+    so a rank is a sum over the distinct scores above it rather than a count over every game ever played.
+    Seeds are unsigned 64-bit numbers, which SQLite cannot store as integers, so they are stored as the signed 64-bit
+    integer with the same bits (see encode_seed)."""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scores (
+            id INTEGER PRIMARY KEY, settings INTEGER NOT NULL, day TEXT NOT NULL, score INTEGER NOT NULL,
+            name TEXT, seed INTEGER);
+        CREATE INDEX IF NOT EXISTS scores_by_settings ON scores (settings, score DESC);
+        CREATE INDEX IF NOT EXISTS scores_by_day ON scores (settings, day, score DESC);
+        CREATE TABLE IF NOT EXISTS score_counts (
+            settings INTEGER NOT NULL, day TEXT NOT NULL, score INTEGER NOT NULL, games INTEGER NOT NULL,
+            PRIMARY KEY (settings, day, score)) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: Path = DATA_DIRECTORY / "leaderboard.sqlite3", batch_size: int = 512,
+                 flush_interval: float = 0.5):
+        self._path = Path(path)
+        self._batch_size = batch_size           # most scores written in a single transaction.
+        self._flush_interval = flush_interval   # seconds a queued score may wait before it is written.
+        self._local = threading.local()         # query connection of each thread.
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        connection = self._connect()
+        try:
+            with connection:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(Leaderboard.SCHEMA)
+        finally:
+            connection.close()
+
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_batches, name="leaderboard", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> "sqlite3.Connection":
+        import sqlite3
+        connection = sqlite3.connect(self._path, timeout=30)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _query(self, sql: str, parameters: tuple) -> list:
+        """Runs a read-only query on the calling thread's own connection. WAL lets it run while a batch is written."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection.execute(sql, parameters).fetchall()
+
+    @staticmethod
+    def today() -> str:
+        return time.strftime("%Y-%m-%d", time.gmtime())
+
+    @staticmethod
+    def encode_seed(seed: int | None) -> int | None:
+        """Returns an unsigned 64-bit seed as the signed 64-bit integer with the same bits."""
+        if seed is None:
+            return None
+        if not 0 <= seed < 1 << 64:
+            raise ValueError(f"Leaderboard.encode_seed: the seed must be within [0, 2^64), not {seed}.")
+        return seed - (1 << 64) if seed >= 1 << 63 else seed
+
+    def record(self, score: int, settings: dict, name: str | None = None, seed: int | None = None) -> None:
+        """Queues a finished game's score. It is written by the background thread shortly after."""
+        self._queue.put((ReplayLog.encode_settings(settings), Leaderboard.today(), score, name,
+                         Leaderboard.encode_seed(seed)))
+
+    def record_game(self, engine: GameEngine, name: str | None = None) -> None:
+        """Queues the score of the game that the engine just played."""
+        self.record(engine.get_score(), dict.fromkeys(engine.get_categories(), True), name, engine.get_seed())
+
+    def _write_batches(self) -> None:
+        """Writes queued scores in batches until close() queues None."""
+        connection = self._connect()
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < self._batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                running = False
+            rows = [row for row in batch if row is not None]
+            try:
+                if rows:
+                    self._write_rows(connection, rows)
+            finally:
+                # flush() waits on every queued score, so each one is marked as done even if it could not be written.
+                for _ in batch:
+                    self._queue.task_done()
+        connection.close()
+
+    def _write_rows(self, connection: "sqlite3.Connection", rows: list) -> None:
+        """Writes a batch of scores in one transaction. If the batch fails, its scores are written one at a time
+        instead, so a single bad score is dropped rather than the batch (or the writer thread)."""
+        try:
+            Leaderboard._insert(connection, rows)
+            return
+        except Exception:
+            if len(rows) == 1:
+                if METRICS.enabled:
+                    METRICS.count("leaderboard_dropped_total")
+                return
+        for row in rows:
+            self._write_rows(connection, [row])
+
+    @staticmethod
+    def _insert(connection: "sqlite3.Connection", rows: list) -> None:
+        with connection:
+            connection.executemany("INSERT INTO scores (settings, day, score, name, seed) "
+                                   "VALUES (?, ?, ?, ?, ?)", rows)
+            connection.executemany("INSERT INTO score_counts VALUES (?, ?, ?, 1) ON CONFLICT (settings, day, score) "
+                                   "DO UPDATE SET games = games + 1", [row[:3] for row in rows])
+
+    def flush(self) -> None:
+        """Waits until every queued score has been written."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Writes the remaining scores and stops the background thread."""
+        self._queue.put(None)
+        self._writer.join()
+
+    def top(self, settings: dict, k: int = 10, day: str | None = None) -> list:
+        """Returns the k best (score, name, day) for a settings mix, optionally only for a single day.
+        The rows are read straight off the index in score order."""
+        if day is None:
+            return self._query("SELECT score, name, day FROM scores WHERE settings = ? ORDER BY score DESC LIMIT ?",
+                               (ReplayLog.encode_settings(settings), k))
+        return self._query("SELECT score, name, day FROM scores WHERE settings = ? AND day = ? "
+                           "ORDER BY score DESC LIMIT ?", (ReplayLog.encode_settings(settings), day, k))
+
+    def rank(self, score: int, settings: dict, day: str | None = None) -> int:
+        """Returns the rank a score would have for a settings mix (1 is the best), optionally only for a single day.
+        Only the distinct scores above it are summed, never the individual games."""
+        if day is None:
+            (above,), = self._query("SELECT COALESCE(SUM(games), 0) FROM score_counts WHERE settings = ? "
+                                    "AND score > ?", (ReplayLog.encode_settings(settings), score))
+        else:
+            (above,), = self._query("SELECT COALESCE(SUM(games), 0) FROM score_counts WHERE settings = ? "
+                                    "AND day = ? AND score > ?", (ReplayLog.encode_settings(settings), day, score))
+        return above + 1
+
+
+class Screen:
+    """Buffered output for the shell front end. Lines are collected in one buffer and written with a single write and
+    flush, right before the game pauses or asks for input, so a whole screen reaches a slow terminal at once instead
+    of one system call per line."""
+    PAGE_SIZE = 1_000
+
+    def __init__(self, stream=None):
+        self._stream = stream                   # None writes to whatever sys.stdout is at the time.
+        self._buffer = list()
+
+    def _output(self):
+        return sys.stdout if self._stream is None else self._stream
+
+    def write(self, text: str = "", end: str = "\n") -> None:
+        """Adds text to the screen, like print."""
+        self._buffer.append(text)
+        self._buffer.append(end)
+
+    def flush(self) -> None:
+        """Writes everything on the screen so far in one go."""
+        if not self._buffer:
+            return
+        output = self._output()
+        output.write("".join(self._buffer))
+        output.flush()
+        self._buffer.clear()
+        if METRICS.enabled:
+            METRICS.count("screen_writes_total")
+
+    def ask(self, prompt: str) -> str:
+        """Writes the screen together with the prompt and returns the player's input."""
+        self.write(prompt, end="")
+        self.flush()
+        return input()
+
+    def page(self, lines) -> None:
+        """Writes many lines a page at a time, so a listing never has to be built in full. On a terminal, every page
+        is one screenful and waits for the player (who can stop the listing), otherwise pages are PAGE_SIZE lines."""
+        import shutil
+        interactive = self._output().isatty() and sys.stdin.isatty()
+        page_size = max(1, shutil.get_terminal_size().lines - 1) if interactive else Screen.PAGE_SIZE
+
+        lines = iter(lines)
+        page = list(itertools.islice(lines, page_size))
+        while page:
+            for line in page:
+                self.write(line)
+            page = list(itertools.islice(lines, page_size))
+            if page and interactive:
+                if self.ask("-- more: [ENTER] to continue, 'Q' to stop --").upper().strip() == "Q":
+                    break
+            else:
+                self.flush()
+        self.flush()
+
+
+class HigherLower:
+    """Class representing the actual higher-lower game. It can take into account semimajor axis size, eccentricity,
+    mass, gravity, and radius of two different bodies, and the orbital statistics derived from them."""
+    def __init__(self, solar_system: {dict, BodyCatalog}, replay_file: Path | None = None,
+                 leaderboard: Leaderboard | None = None, settings: dict | None = None, seed: int | None = None,
+                 pace: float = 1.0, cheat: bool | None = None, screen: Screen | None = None, adaptive: bool = False):
+        # everything is printed through one buffered screen, which is written whenever the game waits.
+        self._screen = Screen() if screen is None else screen
+
+        # by default, the game has all settings enabled.
+        self._category = {"Semimajor Axis": True, "Eccentricity": True, "Mass": True, "Gravity": True, "Radius": True,
+                          "Perihelion": True, "Aphelion": True, "Density": True, "Escape Velocity": True,
+                          "Orbital Period": True}
+
+        # every pause is scaled by the pace, and the game is played with the given seed (a random one otherwise).
+        # an adaptive game draws opponents that get closer to the current body as the score rises.
+        self._pace = pace
+        self._seed = seed
+        self._adaptive = adaptive
+
+        # stores all the solar system bodies as a shared catalog and the headless engine that runs the game.
+        # the engine keeps track of the score and whether the player has not lost.
+        self._catalog = BodyCatalog()
+        self._engine = None
 
         # performs the pre-game setup, such as printing instructions, changing settings, and inserting all bodies.
-        self._print_instructions()
-        self._confirm_settings()
+        # settings that were given up front skip the instructions and the settings prompts.
+        if settings is None:
+            self._print_instructions()
+            self._confirm_settings()
+        else:
+            self._category.update(settings)
+            if not self._verify_new_settings():
+                raise ValueError("HigherLower.__init__: You must have at least one category enabled.")
         self._insert_bodies(solar_system)
+        self._engine = GameEngine(self._catalog)
+
+        # every finished game is appended to the replay log, if one was given.
+        self._replay_log = None if replay_file is None else ReplayLog(replay_file, self._catalog)
+
+        # and its score is kept on the leaderboard, if one was given.
+        self._leaderboard = leaderboard
 
         # for behind-the-scenes stuff:
-        enable_cheats = input(f"DEBUGGING: do you want to enable cheat mode ['YES/'NO']?\n> ")
-        while enable_cheats.lower() not in {"yes", "no"}:
-            enable_cheats = input(f"\tDEBUGGING: bruh, it's ['YES'/'NO]\n> ")
+        if cheat is None:
+            enable_cheats = self._screen.ask(f"DEBUGGING: do you want to enable cheat mode ['YES/'NO']?\n> ")
+            while enable_cheats.lower() not in {"yes", "no"}:
+                enable_cheats = self._screen.ask(f"\tDEBUGGING: bruh, it's ['YES'/'NO]\n> ")
+            cheat = True if enable_cheats == "yes" else False if enable_cheats == "no" else "wtf"
 
-        self._cheat = True if enable_cheats == "yes" else False if enable_cheats == "no" else "wtf"
+        self._cheat = cheat
         if self._cheat:
             self._print_all_bodies()
 
-        # starts the actual game.
-        self._continue_pregame()
+        # starts the actual game, right away if the settings were given up front.
+        if settings is None:
+            self._continue_pregame()
+        else:
+            self._start_game()
 
     ##################################################
     #               HELPER FUNCTIONS                 #
     ##################################################
 
-    def _increase_score(self) -> None:
-        """Increases the score of the player by 1."""
-        self._score += 1
-
-    def _lose_game(self) -> None:
-        """Changes the game state such that the player has lost."""
-        self._alive = False
-
-    def _get_state(self) -> bool:
-        """Returns a boolean value for whether the user is alive or has lost."""
-        return self._alive
-
     def _get_score(self) -> int:
         """Returns the current score of the player."""
-        return self._score
+        return self._engine.get_score()
 
     ##################################################
     #               PREGAME FUNCTIONS                #
@@ -121,17 +1928,17 @@ class HigherLower:
 
     def _confirm_settings(self) -> None:
         """Inquires whether the user would like to change the default settings to custom settings."""
-        print("The game settings have been set to...")
-        sleep(GLOBAL_SLEEP)
+        self._screen.write("The game settings have been set to...")
+        self._pause(GLOBAL_SLEEP)
 
         # prints out the current settings.
         self._print_settings()
-        sleep(GLOBAL_SLEEP)
+        self._pause(GLOBAL_SLEEP)
 
         # repeatedly asks the user if they want to change the settings or not.
-        change_settings = input("Would you like to change the settings ['Y'/'N']? ").upper().strip()
+        change_settings = self._screen.ask("Would you like to change the settings ['Y'/'N']? ").upper().strip()
         while change_settings not in {"Y", "N"}:
-            change_settings = input("\tPlease input a valid response ['Y'/'N']. ").upper().strip()
+            change_settings = self._screen.ask("\tPlease input a valid response ['Y'/'N']. ").upper().strip()
 
         # if the player wishes to change their settings, they may do so.
         if change_settings == "Y":
@@ -139,109 +1946,102 @@ class HigherLower:
 
     def _change_settings(self) -> None:
         """Performs the changes to the user settings."""
-        print()
+        self._screen.write()
 
         # for each category, asks the user if they want to enable ('ON') or disable ('OFF') it.
         for category in self._category.keys():
-            new_setting = input(f"Would you like to turn on or off the setting for {category} "
-                                f"[\"ON/\"OFF\"]? ").upper().strip()
+            new_setting = self._screen.ask(f"Would you like to turn on or off the setting for {category} "
+                                           f"[\"ON/\"OFF\"]? ").upper().strip()
             while new_setting not in {"ON", "OFF"}:
-                new_setting = input(f"\tPlease indicate a valid setting for {category} "
-                                    f"[\"ON/\"OFF\"]. ").upper().strip()
+                new_setting = self._screen.ask(f"\tPlease indicate a valid setting for {category} "
+                                               f"[\"ON/\"OFF\"]. ").upper().strip()
             self._category[category] = True if new_setting == "ON" else False
 
         # checks if the settings are valid.
         if self._verify_new_settings():
-            sleep(GLOBAL_SLEEP)
-            print("\nYour new settings are...")
+            self._pause(GLOBAL_SLEEP)
+            self._screen.write("\nYour new settings are...")
             self._print_settings()
 
         # otherwise, the user has to reset the settings and play with at least one category.
         else:
-            sleep(GLOBAL_SLEEP)
-            print("\nThere was an error with your settings. You must have at least one category enabled.", end="")
+            self._pause(GLOBAL_SLEEP)
+            self._screen.write("\nThere was an error with your settings. You must have at least one category enabled.",
+                               end="")
             self._change_settings()
 
     def _verify_new_settings(self) -> bool:
-        """Checks to see if it is game with a single category.
-        Then, returns whether the game can start (there must be at least one category)"""
-
-        # check to see if only one category is enabled
-        check_single_game = iter(self._category.values())
-        self._single = any(check_single_game) and not any(check_single_game)
-
+        """Returns whether the game can start (there must be at least one category)"""
         # returns true if there is at least one category; returns false if the no categories are enabled.
         return any(self._category.values())
 
     def _print_settings(self) -> None:
         """Prints the settings of the game and indicates whether a category is enabled or disabled."""
         for category, state in self._category.items():
-            print(f"{category:>14}:  {'ON' if state else 'OFF'}")
-        # print(f"The game is set to {'single' if self._single else 'not single'}.")
+            self._screen.write(f"{category:>15}:  {'ON' if state else 'OFF'}")
 
-    @staticmethod
-    def _print_instructions() -> None:
+    def _print_instructions(self) -> None:
         """Prints the instructions for the game and may be called multiple times."""
         sleep_amount = 3
 
-        print("Welcome to the game of Higher and Lower but for our Solar System!")
-        sleep(sleep_amount)
+        self._screen.write("Welcome to the game of Higher and Lower but for our Solar System!")
+        self._pause(sleep_amount)
 
-        print("The rules for the game is quite simple...")
-        sleep(sleep_amount)
+        self._screen.write("The rules for the game is quite simple...")
+        self._pause(sleep_amount)
 
-        print("You will first be given one Solar System body "
-              "along with a single stat.")
-        sleep(sleep_amount)
+        self._screen.write("You will first be given one Solar System body "
+                           "along with a single stat.")
+        self._pause(sleep_amount)
 
-        print("You must determine whether the second body has higher or lower amount"
-              " of that statistic.")
-        sleep(sleep_amount)
+        self._screen.write("You must determine whether the second body has higher or lower amount"
+                           " of that statistic.")
+        self._pause(sleep_amount)
 
-        print("Simply type 'Higher' (case-insensitive) if the right body has a higher trait amount.")
-        sleep(sleep_amount)
+        self._screen.write("Simply type 'Higher' (case-insensitive) if the right body has a higher trait amount.")
+        self._pause(sleep_amount)
 
-        print("Otherwise, type 'Lower' (case-insensitive) if the right body has a lower trait amount.")
-        sleep(sleep_amount)
+        self._screen.write("Otherwise, type 'Lower' (case-insensitive) if the right body has a lower trait amount.")
+        self._pause(sleep_amount)
 
-        print("You will get a point if you guess correctly, but if you lose, it is game over.")
-        sleep(sleep_amount)
+        self._screen.write("You will get a point if you guess correctly, but if you lose, it is game over.")
+        self._pause(sleep_amount)
 
-        print("The next round will always continue using the previous round's body. "
-              "However, if you decide to only play with one trait, then that trait will not change. ")
-        sleep(sleep_amount)
-        print()
+        self._screen.write("The next round will always continue using the previous round's body. "
+                           "However, if you decide to only play with one trait, then that trait will not change. ")
+        self._pause(sleep_amount)
+        self._screen.write()
 
     def _continue_pregame(self) -> None:
         """Inquires whether the user would like to start the game, change settings, or view instructions."""
         pregame_sleep = 0.5
-        print()
+        self._screen.write()
 
-        print("What would you like to do?")
-        sleep(GLOBAL_SLEEP)
+        self._screen.write("What would you like to do?")
+        self._pause(GLOBAL_SLEEP)
 
-        print("[START] the game.")
-        sleep(pregame_sleep)
+        self._screen.write("[START] the game.")
+        self._pause(pregame_sleep)
 
-        print("[CHANGE] the settings.")
-        sleep(pregame_sleep)
+        self._screen.write("[CHANGE] the settings.")
+        self._pause(pregame_sleep)
 
-        print("[VIEW SETTINGS].")
-        sleep(pregame_sleep)
+        self._screen.write("[VIEW SETTINGS].")
+        self._pause(pregame_sleep)
 
-        print("[VIEW INSTRUCTIONS].")
-        sleep(pregame_sleep)
+        self._screen.write("[VIEW INSTRUCTIONS].")
+        self._pause(pregame_sleep)
 
         # repeatedly asks the user for whether they want to start the game, change the settings, view settings,
         # or view the instructions again.
-        command = input("> ").upper().strip()
+        command = self._screen.ask("> ").upper().strip()
         while command not in {"START", "CHANGE", "VIEW SETTINGS", "VIEW INSTRUCTIONS"}:
-            command = input(f"\tPlease supply a valid command. ").upper().strip()
+            command = self._screen.ask(f"\tPlease supply a valid command. ").upper().strip()
 
-        sleep(GLOBAL_SLEEP/2)
+        self._pause(GLOBAL_SLEEP/2)
         if command == "START":
             # we will start the game!
-            self._start_game_single() if self._single else self._start_game()
+            self._start_game()
 
         elif command == "CHANGE":
             # we will change the settings.
@@ -265,200 +2065,109 @@ class HigherLower:
     #               GAME FUNCTIONS                   #
     ##################################################
 
+    def _pause(self, seconds: float) -> None:
+        """Deliberately pauses the game, scaled by the pace (0 never pauses).
+        Pauses are measured on their own so they never count as latency."""
+        seconds *= self._pace
+        if seconds > 0:
+            # whatever was printed before the pause has to be on the screen while the game waits.
+            self._screen.flush()
+            sleep(seconds)
+        if METRICS.enabled:
+            METRICS.observe("pause_seconds", seconds)
+
     @staticmethod
     def _convert(characteristic: str) -> str:
         """Returns the correctly formatted get_{characteristic} as a string."""
         return f"get_{characteristic.replace(' ', '_').lower()}"
 
-    def _new_round(self, left_body: Body, right_body: Body, characteristic: str) -> str:
+    def _new_round(self, left_body: BodyView, right_body: BodyView, characteristic: str) -> str:
         """Starts a new round for the Higher Lower game.
         Then, it returns whether the user guessed 'higher' or 'lower'"""
 
+        # the text is formatted up front so that its rendering time is measured apart from the pauses between lines.
+        if METRICS.enabled:
+            start = time.perf_counter()
+
         # "The {left body type} {left body name} has [a/an] {characteristic to compare} of {value} {units}."
-        caller = getattr(Body, HigherLower._convert(characteristic))
         a_or_an = 'an' if characteristic[0].lower() in {'a', 'e', 'i', 'o', 'u'} else 'a'
-
-        print(f"The {left_body.get_type()} {left_body.get_name()} has {a_or_an}"
-              f" {characteristic.lower()} of {caller(left_body)} {left_body.get_units(characteristic)}".rstrip(),
-              end=".\n")
-        sleep(GLOBAL_SLEEP/2)
+        left_line = (f"The {left_body.get_type()} {left_body.get_name()} has {a_or_an}"
+                     f" {characteristic.lower()} of {left_body.display(characteristic)} "
+                     f"{left_body.get_units(characteristic)}".rstrip() + ".")
 
         # "The {right body type} {right body name} has a [HIGHER/LOWER] {characteristic to compare} than {left body}"
-        print(f"The {right_body.get_type()} {right_body.get_name()} has a [HIGHER/LOWER]"
-              f" {characteristic.lower()} than {left_body.get_name()}.")
-        sleep(GLOBAL_SLEEP/2)
+        right_line = (f"The {right_body.get_type()} {right_body.get_name()} has a [HIGHER/LOWER]"
+                      f" {characteristic.lower()} than {left_body.get_name()}.")
+        cheat_line = (f"\t\tRight body has {a_or_an} {characteristic.lower()} of {right_body.display(characteristic)} "
+                      f"{right_body.get_units(characteristic)}".rstrip() + ".") if self._cheat else None
+
+        if METRICS.enabled:
+            METRICS.since("render_seconds", start)
+
+        self._screen.write(left_line)
+        self._pause(GLOBAL_SLEEP/2)
+        self._screen.write(right_line)
+        self._pause(GLOBAL_SLEEP/2)
 
         # for debugging purposes (and for the vide)
         if self._cheat:
-            sleep(GLOBAL_SLEEP/2)
-            print("\t!!!!!CHEATING MODE ENABLED FOR DEMONSTRATION PURPOSES!!!!!")
-            print(f"\t\tRight body has {a_or_an} {characteristic.lower()} of {caller(right_body)} "
-                  f"{right_body.get_units(characteristic)}".rstrip(), end=".\n")
+            self._pause(GLOBAL_SLEEP/2)
+            self._screen.write("\t!!!!!CHEATING MODE ENABLED FOR DEMONSTRATION PURPOSES!!!!!")
+            self._screen.write(cheat_line)
 
-        sleep(GLOBAL_SLEEP/2)
-        print("Please type in your answer.")
-        sleep(GLOBAL_SLEEP/4)
+        self._pause(GLOBAL_SLEEP/2)
+        self._screen.write("Please type in your answer.")
+        self._pause(GLOBAL_SLEEP/4)
 
         # repeatedly asks the user for their guess of higher or lower.
-        user_answer = input("\t> ").upper().strip()
+        user_answer = self._screen.ask("\t> ").upper().strip()
         while user_answer not in {"HIGHER", "LOWER"}:
-            user_answer = input(f"Please indicate a valid answer [\"HIGHER\"/\"LOWER\"].\n\t> ").upper().strip()
+            user_answer = self._screen.ask(f"Please indicate a valid answer [\"HIGHER\"/\"LOWER\"].\n\t> ")
+            user_answer = user_answer.upper().strip()
         return user_answer
 
     def _start_game(self) -> None:
-        """Starts and maintains a game where there are more than one category enabled."""
-        # compiles and saves all enabled characteristics.
-        self._match_categories = [key for key, value in self._category.items() if value]
+        """Starts and maintains a game. If only one category is enabled, the engine never changes it."""
+        self._engine.new_game(self._category, self._seed, self._adaptive)
 
-        # performs simple check to see if there are more than two bodies inserted into the game.
-        if len(self._bodies) >= 2:
-            # chooses a random category and a random starting body.
-            current_category = self._choose_random_category()
-            left = self._choose_random_bodies(current_category)
+        # continually runs the game until the player loses.
+        while self._engine.is_alive():
+            # the engine chooses the category and a random comparison body.
+            current_round = self._engine.next_round()
+            right, current_category = current_round.get_right(), current_round.get_characteristic()
 
-            # continually runs the game until the player loses.
-            while self._get_state():
-                # chooses a random comparison body.
-                right = self._choose_random_bodies(current_category)
+            # starts the round and asks for the user's guess.
+            response = self._new_round(current_round.get_left(), right, current_category)
+            result = self._engine.submit(response)
 
-                # starts the round and asks for the user's guess.
-                response = self._new_round(left, right, current_category)
+            # if the user checks correctly...
+            if result.is_correct():
+                # if both bodies have the same value, they can't be higher OR lower.
+                if result.is_free_point():
+                    self._screen.write(f"\tFREE POINT!!!")
 
-                # if the user checks correctly...
-                if HigherLower._check_answer(left, right, current_category, response):
-                    # confirms to the player that they made a correct answer.
-                    self._print_correct_answer()
+                # confirms to the player that they made a correct answer.
+                self._print_correct_answer()
 
-                    # increases the score of the user by 1.
-                    self._increase_score()
-
-                    # readmits the left body into the list containing all bodies.
-                    self._bodies.append(left)
-
-                    # the comparison body is now the basis for the next round.
-                    left = right
-
-                    # returns the category back to the enabled characteristic list and chooses a new random category.
-                    self._return_category(current_category)
-                    current_category = self._choose_random_category()
-
-                # otherwise, they guessed incorrectly.
-                else:
-                    # the player lost the game and append the bodies back into the body list.
-                    self._lose_game()
-                    self._bodies.append(left)
-                    self._bodies.append(right)
-
-                    # prints the score report.
-                    self._print_score_report(right, current_category)
-        else:
-            raise IndexError("HigherLower._start_game: You tried to play a game with less than 2 bodies!")
-
-    def _start_game_single(self) -> None:
-        """Starts and maintains a game where there are more than one category enabled."""
-        # compiles what the solely enabled category was.
-        single_category = self._find_single_category()
-
-        # performs simple check to see if there are more than two bodies inserted into the game.
-        if len(self._bodies) >= 2:
-            # chooses a random starting body.
-            left = self._choose_random_bodies(single_category)
-
-            # continually runs the game until the player loses.
-            while self._get_state():
-                # chooses a random comparison body.
-                right = self._choose_random_bodies(single_category)
-
-                # starts the round and asks for the user's guess.
-                response = self._new_round(left, right, single_category)
-
-                # if the user checks correctly...
-                if HigherLower._check_answer(left, right, single_category, response):
-                    # confirms to the player that they made a correct answer.
-                    self._print_correct_answer()
-
-                    # increases the score of the user by 1.
-                    self._increase_score()
-
-                    # readmits the left body into the list containing all bodies.
-                    self._bodies.append(left)
-
-                    # the comparison body is now the basis for the next round.
-                    left = right
-
-                # otherwise, they guessed incorrectly.
-                else:
-                    # the player lost the game and append the bodies back into the body list.
-                    self._lose_game()
-                    self._bodies.append(left)
-                    self._bodies.append(right)
-
-                    # prints the score report.
-                    self._print_score_report(right, single_category)
-        else:
-            raise IndexError("HigherLower._start_game_single: You tried to play a game with less than 2 bodies!")
-
-    def _find_single_category(self) -> str:
-        """Iterates through the list of categories, assuming it's a single game, and returns whichever is enabled."""
-        # returns the first setting that is enabled.
-        # this assumes that only one setting was enabled, so it short-circuit returns.
-        for key, value in self._category.items():
-            if value:
-                return key
-        else:
-            raise IndexError("HigherLower._find_single_category: there were no categories enabled.")
-
-    def _choose_random_category(self) -> str:
-        """Chooses and returns a random characteristic type if it was enabled."""
-        # checks if there are at least one category to choose from.
-        if len(self._match_categories) >= 1:
-            # shuffles the master list and returns a random characteristic type.
-            random.shuffle(self._match_categories)
-            return self._match_categories.pop()
-        else:
-            raise IndexError(f"HigherLower._choose_random_category: there were not enough categories to choose one"
-                             f"at random.")
-
-    def _choose_random_bodies(self, characteristic: str) -> {Body}:
-        """Chooses and returns a random valid body."""
-        # shuffles the entire list of solar system bodies.
-        random.shuffle(self._bodies)
-
-        # creates a helper function to call the appropriate getter-function for the characteristic.
-        caller = getattr(Body, HigherLower._convert(characteristic))
-        escape = 0
-
-        # grabs a random body.
-        body = self._bodies.pop()
-
-        # checks to see if the body has a non-zero characteristic value.
-        # the API had some values set to 0 which makes the game trivial.
-        while caller(body) == 0 and escape < 1000:
-            # reinserts body back into solar system bodies list.
-            self._bodies.append(body)
-
-            # reshuffles the list.
-            random.shuffle(self._bodies)
-
-            # grabs a new solar system body and increments the failsafe by 1.
-            body = self._bodies.pop()
-            escape += 1
-
-        # terminates body search early if it encounters an infinite loop.
-        if escape >= 1000:
-            raise ValueError(f"HigherLower._choose_random_bodies: game reached a fatal infinite loop.")
+            # otherwise, they guessed incorrectly and the score report is printed.
+            else:
+                self._print_score_report(right, current_category)
 
-        return body
+        if self._replay_log is not None:
+            self._replay_log.append_game(self._engine)
 
-    def _return_category(self, characteristic: str) -> None:
-        """After choosing a random category, this returns the category back to the master list for the next round."""
-        self._match_categories.append(characteristic)
+        if self._leaderboard is not None:
+            rank = self._leaderboard.rank(self._get_score(), self._category)
+            self._leaderboard.record_game(self._engine)
+            self._screen.write(f"That places you #{rank} on the leaderboard for these settings.")
+        self._screen.flush()
 
     @staticmethod
-    def _check_answer(left: Body, right: Body, characteristic: str, response: str) -> bool:
+    def _check_answer(left: {Body, BodyView}, right: {Body, BodyView}, characteristic: str, response: str) -> bool:
         """Performs the calculations and returns whether the player's guess was right or wrong."""
         # creates a helper function to call the appropriate getter-function for the characteristic.
-        caller = getattr(Body, HigherLower._convert(characteristic))
+        # both the original Body and the catalog views share the same getters.
+        caller = getattr(type(left), HigherLower._convert(characteristic))
 
         # This if-statement is unoptimal as we simply could've used logical NOT on the answers.
         # however, if you wanted to review this code, I left it this way.
@@ -553,17 +2262,17 @@ class HigherLower:
         else:
             return None
 
-    def _insert_bodies(self, solar_system: dict) -> None:
-        compiled_bodies = list()
-        # iterates through the entire solar system and inserts a Body only if it has valid data.
-        for body in solar_system["bodies"]:
-            temp_object = HigherLower._create_body(body)
-            if temp_object is not None:
-                compiled_bodies.append(temp_object)
-
-        # check to see if the list contains any bodies.
-        if compiled_bodies:
-            self._bodies = compiled_bodies
+    def _insert_bodies(self, solar_system: {dict, BodyCatalog}) -> None:
+        # iterates through the entire solar system and inserts a body into the catalog only if it has valid data.
+        # a catalog that was already built (e.g. from a snapshot) is used as is.
+        if isinstance(solar_system, BodyCatalog):
+            catalog = solar_system
+        else:
+            catalog = BodyCatalog.from_solar_system(solar_system)
+
+        # check to see if the catalog contains any bodies.
+        if len(catalog):
+            self._catalog = catalog
         else:
             raise ValueError(f"HigherLower._insert_bodies: no Solar System bodies have been inserted.")
 
@@ -593,37 +2302,278 @@ class HigherLower:
     #               PRINTING FUNCTIONS               #
     ##################################################
 
-    @staticmethod
-    def _print_correct_answer() -> None:
+    def _print_correct_answer(self) -> None:
         """Simple helper that prints that the player guessed correctly."""
-        print()
-        print(f"!"*25)
-        print(f"{' '*8}CORRECT\n")
+        self._screen.write()
+        self._screen.write(f"!"*25)
+        self._screen.write(f"{' '*8}CORRECT\n")
 
-    def _print_score_report(self, right: Body, characteristic: str) -> None:
+    def _print_score_report(self, right: BodyView, characteristic: str) -> None:
         """Simply prints that the user made an incorrect guess."""
-        caller = getattr(Body, HigherLower._convert(characteristic))
         a_or_an = 'an' if characteristic[0].lower() in {'a', 'e', 'i', 'o', 'u'} else 'a'
 
-        print("#"*39)
-        print()
-        print(f"Oh no! That is unfortunately incorrect!")
-        print(f"{right.get_name()} has {a_or_an} {characteristic.lower()} of {caller(right)} "
-              f"{right.get_units(characteristic)}".rstrip() + ".")
-        print(f"Your final score is {self._get_score()}.")
-        print("Thank you for playing!")
+        self._screen.write("#"*39)
+        self._screen.write()
+        self._screen.write(f"Oh no! That is unfortunately incorrect!")
+        self._screen.write(f"{right.get_name()} has {a_or_an} {characteristic.lower()} of "
+                           f"{right.display(characteristic)} {right.get_units(characteristic)}".rstrip() + ".")
+        self._screen.write(f"Your final score is {self._get_score()}.")
+        self._screen.write("Thank you for playing!")
 
     def _print_all_bodies(self) -> None:
-        """Debugging function that prints out the traits of all Solar System bodies."""
-        for body in self._bodies:
-            print(f"name = {body.get_name():>20} \tsemimajor axis = {body.get_semimajor_axis():>15} \teccentricity = "
-                  f"{body.get_eccentricity():>5} \tmass = {body.get_mass():>20} \tgravity = {body.get_gravity():>5} "
-                  f"\tradius = {body.get_radius():>10} \tbody type = {body.get_type():>15}.")
+        """Debugging function that prints out the traits of all Solar System bodies, a page at a time."""
+        self._screen.page(f"name = {body.get_name():>20} \tsemimajor axis = {body.get_semimajor_axis():>15} "
+                          f"\teccentricity = {body.get_eccentricity():>5} \tmass = {body.get_mass():>20} "
+                          f"\tgravity = {body.get_gravity():>5} \tradius = {body.get_radius():>10} "
+                          f"\tbody type = {body.get_type():>15}." for body in self._catalog.views())
+
+
+class GameSession:
+    """Line protocol for a single player of the GameServer. It only holds its settings and its own GameEngine, while
+    the catalog is shared by every session. Every command returns the lines to send back to the player.
+
+    Commands (case-insensitive):
+        SETTINGS                   lists every category and whether it is enabled.
+        SET <category> <ON/OFF>    enables or disables a category.
+        START [seed] [ADAPTIVE]    starts a new game, where ADAPTIVE draws ever closer opponents.
+        HIGHER / LOWER             answers the current round.
+        HELP                       lists the commands.
+        QUESTIONS <count> [stats]  lists practice questions with their answers.
+        QUIT                       ends the session."""
+    MAX_QUESTIONS = 10_000
+
+    # commands that can take long enough to be run off the server's event loop.
+    BLOCKING = ("QUESTIONS",)
+
+    def __init__(self, catalog: BodyCatalog | CatalogStore, replay_log: ReplayLog | None = None,
+                 leaderboard: Leaderboard | None = None, settings: dict | None = None, adaptive: bool = False):
+        self._category = dict.fromkeys(BodyCatalog.UNITS, True)
+        self._category.update(settings or {})
+        self._adaptive = adaptive               # whether START plays adaptive games without being asked to.
+        self._engine = GameEngine(catalog)
+        self._replay_log = replay_log
+        self._leaderboard = leaderboard
+        self._round = None
+        self._closed = False
+
+    def is_closed(self) -> bool:
+        return self._closed
+
+    def is_blocking(self, line: str) -> bool:
+        """Returns whether the command can take long enough that it should not run on an event loop: the commands in
+        BLOCKING, and an answer that ends the game when the game is recorded or ranked, which both go to disk."""
+        command = line.strip().partition(" ")[0].upper()
+        if command in GameSession.BLOCKING:
+            return True
+        if command not in GameEngine.ANSWERS or self._round is None:
+            return False
+        if self._replay_log is None and self._leaderboard is None:
+            return False
+        played = self._round
+        return not GameEngine.judge(played.get_left(), played.get_right(), played.get_characteristic(), command)[0]
+
+    def wants_round(self) -> bool:
+        """Returns whether the game is running and the next round still has to be dealt."""
+        return self._engine.is_alive() and self._round is None
+
+    def deal(self) -> list:
+        """Deals the next round and returns its description."""
+        self._round = self._engine.next_round()
+        if METRICS.enabled:
+            start = time.perf_counter()
+            lines = self._describe_round()
+            METRICS.since("render_seconds", start)
+            return lines
+        return self._describe_round()
+
+    def _describe_round(self) -> list:
+        left, right = self._round.get_left(), self._round.get_right()
+        characteristic = self._round.get_characteristic()
+        return [f"ROUND\t{self._round.get_number()}\t{characteristic}\t{left.get_type()}\t{left.get_name()}\t"
+                f"{left.display(characteristic)}\t{left.get_units(characteristic)}\t{right.get_type()}\t{right.get_name()}"]
+
+    def handle(self, line: str) -> list:
+        """Performs a single command and returns the reply lines."""
+        command, _, argument = line.strip().partition(" ")
+        command = command.upper()
+
+        if command in GameEngine.ANSWERS:
+            if self._round is None:
+                return ["ERROR\tthere is no round waiting for an answer."]
+            result = self._engine.submit(command)
+            right, characteristic = self._round.get_right(), self._round.get_characteristic()
+            self._round = None
+            reply = [f"RESULT\t{'CORRECT' if result.is_correct() else 'INCORRECT'}\t{result.get_score()}\t"
+                     f"{'FREE' if result.is_free_point() else ''}\t{right.display(characteristic)}\t"
+                     f"{right.get_units(characteristic)}"]
+            if not result.is_alive():
+                reply.append(f"OVER\t{result.get_score()}")
+                if self._replay_log is not None:
+                    self._replay_log.append_game(self._engine)
+                if self._leaderboard is not None:
+                    reply.append(f"RANK\t{self._leaderboard.rank(result.get_score(), self._category)}")
+                    self._leaderboard.record_game(self._engine)
+            return reply
+
+        elif command == "START":
+            options = argument.split()
+            adaptive = bool(options) and options[-1].upper() == "ADAPTIVE"
+            if adaptive:
+                options.pop()
+            if len(options) > 1:
+                return ["ERROR\tusage: START [seed] [ADAPTIVE]."]
+            try:
+                seed = int(options[0]) if options else None
+                self._engine.new_game(self._category, seed, adaptive or self._adaptive)
+            except ValueError as error:
+                return [f"ERROR\t{error}"]
+            self._round = None
+            return ["OK\tSTART"]
+
+        elif command == "SET":
+            category, _, state = argument.strip().rpartition(" ")
+            matches = [key for key in self._category if key.lower() == category.strip().lower()]
+            if not matches or state.upper() not in {"ON", "OFF"}:
+                return ["ERROR\tusage: SET <category> <ON/OFF>."]
+            self._category[matches[0]] = state.upper() == "ON"
+            return [f"SETTING\t{matches[0]}\t{state.upper()}"]
+
+        elif command == "SETTINGS":
+            return [f"SETTING\t{category}\t{'ON' if state else 'OFF'}" for category, state in self._category.items()]
+
+        elif command == "QUESTIONS":
+            try:
+                count, stats = (list(map(int, argument.split())) + [1])[:2]
+                batch = generate_questions(self._engine.get_catalog(), min(count, GameSession.MAX_QUESTIONS),
+                                           [category for category, state in self._category.items() if state], stats)
+            except ValueError as error:
+                return [f"ERROR\tusage: QUESTIONS <count> [stats] ({error})."]
+            return [f"QUESTION\t{left.get_name()}\t{right.get_name()}\t{','.join(characteristics)}\t"
+                    f"{','.join(answer or 'EITHER' for answer in answers)}"
+                    for left, right, characteristics, answers in batch]
+
+        elif command == "HELP":
+            return ["HELP\t" + line.strip() for line in GameSession.__doc__.splitlines()[3:] if line.strip()]
+
+        elif command == "QUIT":
+            self._closed = True
+            return ["BYE"]
+
+        return [f"ERROR\tunknown command {command!r}, type HELP for the list of commands."]
+
+
+class GameServer:
+    """Asyncio server that hosts many concurrent GameSessions over TCP or a Unix socket.
+    The catalog is built once and shared, and the pacing between rounds never blocks other sessions.
+    The catalog can be reloaded while the server runs, and every game started afterwards uses the new version."""
+    BACKLOG = 4096
+
+    def __init__(self, catalog: BodyCatalog | CatalogStore, pace: float = GLOBAL_SLEEP / 2,
+                 replay_log: ReplayLog | None = None, leaderboard: Leaderboard | None = None, adaptive: bool = False):
+        self._store = catalog if isinstance(catalog, CatalogStore) else CatalogStore(catalog)
+        self._pace = pace                       # pause in seconds before each new round is dealt.
+        self._replay_log = replay_log           # log that every finished game is appended to, if any.
+        self._leaderboard = leaderboard         # leaderboard that every final score is queued for, if any.
+        self._adaptive = adaptive               # whether every session plays adaptive games by default.
+        self._sessions = 0
+
+    def get_session_count(self) -> int:
+        """Returns the number of players that are currently connected."""
+        return self._sessions
+
+    async def start(self, host: str = "127.0.0.1", port: int = 4545, path: str | None = None):
+        """Starts listening on a Unix socket if a path is given, otherwise on TCP, and returns the asyncio server."""
+        import asyncio
+        # thousands of players may connect at once, so the listen backlog is much larger than the default.
+        if path is not None:
+            return await asyncio.start_unix_server(self._handle_client, path=path, backlog=GameServer.BACKLOG)
+        return await asyncio.start_server(self._handle_client, host=host, port=port, backlog=GameServer.BACKLOG)
+
+    def get_store(self) -> CatalogStore:
+        return self._store
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 4545, path: str | None = None,
+                            source: "DataSource | None" = None, reload_interval: float | None = None) -> None:
+        """Serves until cancelled, reloading the catalog from the source every reload_interval seconds if given."""
+        import asyncio
+        if source is not None and reload_interval and self._replay_log is not None:
+            raise ValueError("GameServer.serve_forever: a replay log is checked against a single catalog, so the "
+                             "catalog cannot be reloaded while games are recorded.")
+        server = await self.start(host, port, path)
+        reloader = None
+        if source is not None and reload_interval:
+            reloader = asyncio.create_task(self._reload_every(source, reload_interval))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if reloader is not None:
+                reloader.cancel()
+
+    async def reload(self, source: "DataSource") -> tuple:
+        """Applies the source's current records to the catalog on a worker thread, so sessions keep playing.
+        Returns the lists of body keys that were added, changed and removed."""
+        import asyncio
+        if self._replay_log is not None:
+            raise ValueError("GameServer.reload: a replay log is checked against a single catalog, so the catalog "
+                             "cannot be reloaded while games are recorded.")
+        return await asyncio.to_thread(lambda: self._store.update(source.records()))
+
+    async def _reload_every(self, source: "DataSource", interval: float) -> None:
+        import asyncio
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload(source)
+            except (OSError, ValueError):
+                # the source is unavailable or broken, so the current catalog stays until the next attempt.
+                pass
+
+    async def _handle_client(self, reader: "asyncio.StreamReader", writer: "asyncio.StreamWriter") -> None:
+        """Runs a single session until the player quits or disconnects."""
+        import asyncio
+        session = GameSession(self._store, self._replay_log, self._leaderboard, adaptive=self._adaptive)
+        self._sessions += 1
+        try:
+            await GameServer._send(writer, ["WELCOME\tSolar System Higher Lower, type HELP for the commands."])
+            while not session.is_closed():
+                line = await reader.readline()
+                if not line:
+                    break
+
+                # practice questions and finished games (ranked and recorded) are handled on a worker thread, so they
+                # never stall the other sessions.
+                text = line.decode("utf-8", errors="replace")
+                if session.is_blocking(text):
+                    await GameServer._send(writer, await asyncio.to_thread(session.handle, text))
+                else:
+                    await GameServer._send(writer, session.handle(text))
+
+                # the pause before the next round only delays this session.
+                if session.wants_round():
+                    if self._pace > 0:
+                        await asyncio.sleep(self._pace)
+                    await GameServer._send(writer, session.deal())
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as error:
+            # the catalog ran out of valid bodies for this session, so it cannot continue.
+            await GameServer._send(writer, [f"ERROR\t{error}"])
+        finally:
+            self._sessions -= 1
+            writer.close()
+
+    @staticmethod
+    async def _send(writer: "asyncio.StreamWriter", lines: list) -> None:
+        writer.write("".join(f"{line}\n" for line in lines).encode("utf-8"))
+        await writer.drain()
 
 
 def acquire_solar_system(url: str) -> dict:
     """Given a URL to the API, returns a Python dictionary for the parsed JSON response.
     This function structure was what as taught when I took ICS 32A with Professor Thornton"""
+    import json
+    import urllib.request
     url_response = None
 
     try:
@@ -645,31 +2595,1061 @@ def acquire_solar_system(url: str) -> dict:
 def acquire_offline_solar_system(file: Path) -> dict:
     """Given a json file of the Solar System API, returns a Python diction for the parsed JSON response.
     This is for offline testing to prevent creating superfluous connections to the website."""
+    import json
     with open(file) as json_file:
         extracted_json = json.load(json_file)
     return extracted_json
 
 
-# Press the green button in the gutter to run the script.
-if __name__ == '__main__':
-    website_or_file = input("Would you like to use the website or a file ['website'/'file']?\n> ")
-
-    if website_or_file.lower() == "website":
+def iter_bodies(text_stream, chunk_size: int = 1 << 16):
+    """Yields the records of the "bodies" array of an API response one at a time while reading the stream in chunks.
+    Only the record being parsed is kept in memory, rather than the whole document and its dictionary tree."""
+    import json
+    decoder = json.JSONDecoder()
+    bodies_key = re.compile(r'"bodies"\s*:\s*\[')
+    buffer = ""
+    position = None
+
+    # reads until the start of the "bodies" array is found.
+    while position is None:
+        chunk = text_stream.read(chunk_size)
+        if not chunk:
+            raise ValueError("iter_bodies: the response does not contain a \"bodies\" array.")
+        buffer += chunk
+        match = bodies_key.search(buffer)
+        if match is not None:
+            position = match.end()
+        else:
+            # keeps enough of the tail in case the key was split between two chunks.
+            buffer = buffer[-32:]
+
+    exhausted = False
+    while True:
+        # skips the separators between two records.
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+
+        if position < len(buffer) and buffer[position] == "]":
+            return
+
+        try:
+            if position >= len(buffer):
+                raise json.JSONDecodeError("incomplete record", buffer, position)
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # the record is incomplete, so the next chunk is read before trying again.
+            if exhausted:
+                raise ValueError("iter_bodies: the \"bodies\" array ended unexpectedly.")
+            chunk = text_stream.read(chunk_size)
+            exhausted = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield record
+
+
+def build_snapshot(source: "DataSource", snapshot_file: Path) -> BodyCatalog:
+    """Filters and normalizes the bodies of a source once and writes them as a binary catalog snapshot."""
+    catalog = source.catalog()
+    catalog.write_snapshot(snapshot_file)
+    return catalog
+
+
+def measure_startup(json_file: Path, snapshot_file: Path, repeat: int = 5) -> dict:
+    """Returns the best time in seconds to build a catalog from the json file and from its snapshot, the same way
+    --file loads either of them."""
+    timings = {"json": float("inf"), "snapshot": float("inf")}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        FileSource(json_file).catalog()
+        timings["json"] = min(timings["json"], time.perf_counter() - start)
+
+        start = time.perf_counter()
+        SnapshotSource(snapshot_file).catalog()
+        timings["snapshot"] = min(timings["snapshot"], time.perf_counter() - start)
+    return timings
+
+
+def synthetic_solar_system(count: int, seed: int = 0) -> dict:
+    """Returns a randomly generated response in the same schema as the API's /rest/bodies/ endpoint.
+    Roughly as in the real data, some bodies are missing fields, have values of 0, are unnamed "S/" moons, or have
+    masses that are not in scientific notation yet."""
+    rng = random.Random(seed)
+    body_types = ("Planet", "Moon", "Moon", "Moon", "Asteroid", "Asteroid", "Comet", "Dwarf Planet")
+    planets = [f"planet-{index}" for index in range(8)]
+    bodies = list()
+
+    for index in range(count):
+        body_type = "Star" if index == 0 else rng.choice(body_types)
+        name = f"S/2004 S {index}" if rng.random() < 0.05 else f"{index} Body {index}"
+        mass = None if rng.random() < 0.1 else {"massValue": rng.choice((round(rng.uniform(1, 10), 5),
+                                                                         round(rng.uniform(0.001, 1), 5),
+                                                                         round(rng.uniform(10, 5000), 3))),
+                                                "massExponent": rng.randint(10, 30)}
+        bodies.append({
+            "id": planets[index] if body_type == "Planet" and index < len(planets) else f"body-{index}",
+            "name": name,
+            "englishName": name,
+            "isPlanet": body_type == "Planet",
+            "semimajorAxis": 0 if rng.random() < 0.05 else rng.randint(1_000, 6_000_000_000),
+            "perihelion": 0,
+            "aphelion": 0,
+            "eccentricity": 0 if rng.random() < 0.1 else round(rng.random(), 5),
+            "inclination": round(rng.uniform(0, 180), 2),
+            "mass": mass,
+            "vol": None,
+            "density": round(rng.uniform(0.5, 8), 3),
+            "gravity": 0 if rng.random() < 0.3 else round(rng.uniform(0.01, 30), 2),
+            "escape": 0,
+            "meanRadius": 0 if rng.random() < 0.1 else round(rng.uniform(0.5, 70_000), 1),
+            "bodyType": body_type,
+            "aroundPlanet": {"planet": rng.choice(planets), "rel": ""} if body_type == "Moon" else None,
+        })
+        if rng.random() < 0.02:
+            bodies[-1][rng.choice(("semimajorAxis", "eccentricity", "gravity", "meanRadius"))] = None
+
+    return {"bodies": bodies}
+
+
+def run_benchmarks(sizes=(1_000, 100_000, 1_000_000), output: Path | None = Path("bench_output.json"),
+                   rounds: int = 100_000, checks: int = 1_000_000, seed: int = 0) -> dict:
+    """Benchmarks ingestion, round generation and answer checking offline against synthetic catalogs.
+    Results are returned (and written to output as JSON if given) so that runs can be compared."""
+    import json
+    import platform
+    import tempfile
+    import tracemalloc
+    results = {"python": platform.python_version(), "platform": platform.platform(), "time": time.time(),
+               "sizes": list()}
+
+    for size in sizes:
+        payload = json.dumps(synthetic_solar_system(size, seed))
+        result = {"bodies": size, "payload_bytes": len(payload)}
+
+        start = time.perf_counter()
+        solar_system = json.loads(payload)
+        result["json_load_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        catalog = BodyCatalog.from_solar_system(solar_system)
+        result["catalog_build_seconds"] = time.perf_counter() - start
+        result["catalog_bodies"] = len(catalog)
+
+        start = time.perf_counter()
+        for characteristic in BodyCatalog.UNITS:
+            catalog.sort_keys(characteristic)
+            catalog.valid_indices(characteristic)
+        result["index_build_seconds"] = time.perf_counter() - start
+
+        # the memory retained by a catalog is measured on a separate build since tracing slows it down.
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        traced = BodyCatalog.from_solar_system(solar_system)
+        result["catalog_memory_bytes"] = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del traced, solar_system
+
+        # the start of a game from the json file against the start from its snapshot.
+        with tempfile.TemporaryDirectory() as directory:
+            json_file, snapshot_file = Path(directory) / "bodies.json", Path(directory) / "bodies.snapshot"
+            json_file.write_text(payload, encoding="utf-8")
+            del payload
+            build_snapshot(FileSource(json_file), snapshot_file)
+            startup = measure_startup(json_file, snapshot_file, repeat=3)
+        result["startup_json_seconds"] = startup["json"]
+        result["startup_snapshot_seconds"] = startup["snapshot"]
+
+        # rounds per second of a player that always answers 'HIGHER'.
+        engine = GameEngine(catalog)
+        played, game = 0, 0
+        start = time.perf_counter()
+        while played < rounds:
+            engine.new_game(seed=seed + game)
+            game += 1
+            while engine.is_alive() and played < rounds:
+                engine.next_round()
+                engine.submit("HIGHER")
+                played += 1
+        result["rounds_per_second"] = played / (time.perf_counter() - start)
+
+        # answer checks per second, one at a time and in a batch.
+        rng = random.Random(seed)
+        triples = [(rng.randrange(len(catalog)), rng.randrange(len(catalog)), rng.choice(GameEngine.ANSWERS))
+                   for _ in range(checks)]
+        start = time.perf_counter()
+        for left, right, answer in triples:
+            catalog.judge(left, right, "Mass", answer)
+        result["checks_per_second"] = checks / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        catalog.judge_many("Mass", triples)
+        result["batch_checks_per_second"] = checks / (time.perf_counter() - start)
+
+        results["sizes"].append(result)
+
+    if output is not None:
+        with open(output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+    return results
+
+
+def _random_player(catalog: BodyCatalog, played_round: Round, rng: random.Random) -> str:
+    """Simulated player that guesses at random."""
+    return GameEngine.ANSWERS[rng.getrandbits(1)]
+
+
+def _higher_player(catalog: BodyCatalog, played_round: Round, rng: random.Random) -> str:
+    """Simulated player that always answers 'HIGHER'."""
+    return "HIGHER"
+
+
+def _oracle_player(catalog: BodyCatalog, played_round: Round, rng: random.Random) -> str:
+    """Simulated player that knows every value and therefore never loses."""
+    keys = catalog.sort_keys(played_round.get_characteristic())
+    return "HIGHER" if keys[played_round.get_left().get_index()] <= keys[played_round.get_right().get_index()] \
+        else "LOWER"
+
+
+SIMULATED_PLAYERS = {"random": _random_player, "higher": _higher_player, "oracle": _oracle_player}
+
+# catalog shared by every game of a simulation worker, see _start_simulation_worker.
+_simulation_catalog = None
+
+
+def _start_simulation_worker(snapshot_file: Path) -> None:
+    """Memory-maps the simulation's catalog snapshot once per worker, so every worker shares the same read-only pages
+    instead of receiving (or rebuilding) its own copy."""
+    global _simulation_catalog
+    _simulation_catalog = BodyCatalog.from_snapshot(snapshot_file, verify=False)
+
+
+def _simulate_games(categories: tuple, player: str, seeds: range, max_rounds: int) -> tuple:
+    """Plays one simulated game per seed and returns (categories, player, {score: number of games}).
+    Games that reach max_rounds are stopped there, which is how every game of the oracle ends."""
+    catalog = _simulation_catalog
+    choose = SIMULATED_PLAYERS[player]
+    settings = dict.fromkeys(categories, True)
+    engine = GameEngine(catalog)
+    histogram = dict()
+
+    for seed in seeds:
+        engine.new_game(settings, seed)
+        rng = random.Random(f"player-{seed}")
+        rounds = 0
+        while engine.is_alive() and rounds < max_rounds:
+            engine.submit(choose(catalog, engine.next_round(), rng))
+            rounds += 1
+        score = engine.get_score()
+        histogram[score] = histogram.get(score, 0) + 1
+    return categories, player, histogram
+
+
+def simulate(catalog: BodyCatalog, games: int, players=tuple(SIMULATED_PLAYERS), settings_mixes=None,
+             processes: int | None = None, chunk_size: int = 1_000, max_rounds: int = 1_000, seed: int = 0) -> dict:
+    """Plays the given number of simulated games for every player and every settings mix (by default, every
+    category on its own and all of them together) across a process pool. The catalog is written to a snapshot once
+    and memory-mapped by every worker. Returns {(enabled categories, player): {score: number of games}}, merged as
+    each chunk of games finishes so that no individual score is kept."""
+    import concurrent.futures
+    import tempfile
+    if settings_mixes is None:
+        # every combination would be 2^10 - 1 mixes now that the derived characteristics are categories too.
+        settings_mixes = [(characteristic,) for characteristic in BodyCatalog.UNITS] + [tuple(BodyCatalog.UNITS)]
+    unknown = [player for player in players if player not in SIMULATED_PLAYERS]
+    if unknown:
+        raise ValueError(f"simulate: unknown players {unknown}, expected some of {tuple(SIMULATED_PLAYERS)}.")
+
+    histograms = {(tuple(categories), player): dict() for categories in settings_mixes for player in players}
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_file = Path(directory) / "simulation.snapshot"
+        catalog.write_snapshot(snapshot_file)
+
+        with concurrent.futures.ProcessPoolExecutor(processes, initializer=_start_simulation_worker,
+                                                    initargs=(snapshot_file,)) as pool:
+            futures = [pool.submit(_simulate_games, categories, player,
+                                   range(seed + start, seed + min(start + chunk_size, games)), max_rounds)
+                       for categories, player in histograms for start in range(0, games, chunk_size)]
+
+            for future in concurrent.futures.as_completed(futures):
+                categories, player, histogram = future.result()
+                merged = histograms[categories, player]
+                for score, count in histogram.items():
+                    merged[score] = merged.get(score, 0) + count
+    return histograms
+
+
+def _verification_records(rng, count: int) -> list:
+    """Returns random API records for the differential checks. Values come from small pools so that ties (free points)
+    are common, masses sit on and right next to the boundaries of scientific notation and of rounding, and some records
+    are missing fields or have unrecognizable names, so every branch of HigherLower._create_body is exercised."""
+    planets = [f"planet-{index}" for index in range(8)]
+    mantissas = (1, 1.0, 9.999, 10, 10.0, 10.5, 0.5, 0.9995, 0.99949, 1.0005, 9.9995, 99.995, 12.3455, 1234.5,
+                 0.001, 0.0123455, 5, 7.3458)
+    body_types = ("Planet", "Moon", "Moon", "Asteroid", "Comet", "Dwarf Planet")
+    records = list()
+
+    for index in range(count):
+        # values are drawn from a handful of choices (or left at 0) so that equal values come up often.
+        mass = {"massValue": rng.choice(mantissas) if rng.random() < 0.5 else round(rng.uniform(0.001, 5000), 4),
+                "massExponent": rng.randint(15, 20)}
+        body_type = rng.choice(body_types)
+        name = rng.choice((f"{index} Body {index}", f"Body {index % 50}", f"S/2004 S {index}"))
+        record = {
+            "id": f"body-{index}" if index >= len(planets) else planets[index],
+            "englishName": name,
+            "semimajorAxis": rng.choice((0, 1_000, 1_000, 384_400, rng.randint(1_000, 6_000_000_000))),
+            "eccentricity": rng.choice((0, 0.5, 0.0167, round(rng.random(), 5))),
+            "mass": None if rng.random() < 0.05 else mass,
+            "gravity": rng.choice((0, 1.62, 9.8, round(rng.uniform(0.01, 30), 2))),
+            "meanRadius": rng.choice((0, 1737.0, 6371.0084, round(rng.uniform(0.5, 70_000), 1))),
+            "bodyType": body_type,
+            "aroundPlanet": {"planet": rng.choice(planets), "rel": ""} if body_type == "Moon" else None,
+        }
+        if rng.random() < 0.05:
+            record[rng.choice(("englishName", "semimajorAxis", "eccentricity", "gravity", "meanRadius",
+                               "bodyType"))] = None
+        records.append(record)
+    return records
+
+
+def _verify_chunk(seed: int, cases: int, catalog_size: int, limit: int = 20) -> tuple:
+    """Checks the fast paths against the reference rules of HigherLower on one random catalog, and returns
+    ({kind of check: number of cases}, [description of every mismatch, up to the limit]):
+        ingestion: BodyCatalog.from_records, add_record and snapshots accept exactly the bodies _create_body does,
+                   with the same values, and displays every stored characteristic exactly like the reference getter.
+        masses:    BodyCatalog._normalize_masses gives exactly what _create_body does with _fix_mass.
+        judging:   BodyCatalog.judge and judge_many agree with _check_answer, free points included.
+        games:     every round the engine deals is valid, judged like _check_answer, and replays to the same score.
+        scores:    the leaderboard keeps the score of every one of those games, whatever their seeds.
+    About half of the cases are masses and half are judged answers, on top of one catalog and one game per thousand
+    cases."""
+    import contextlib
+    import tempfile
+    rng = random.Random(seed)
+    counts = dict.fromkeys(("ingestion", "masses", "judging", "games", "scores"), 0)
+    mismatches = list()
+
+    def check(kind: str, same: bool, description) -> None:
+        counts[kind] += 1
+        if not same and len(mismatches) < limit:
+            mismatches.append(f"{kind} (seed {seed}): {description()}")
+
+    # _check_answer prints its free points, which are counted instead.
+    class FreePoints:
+        printed = 0
+
+        def write(self, text: str) -> None:
+            FreePoints.printed += "FREE POINT" in text
+
+        def flush(self) -> None:
+            pass
+
+    records = _verification_records(rng, catalog_size)
+    reference = [body for body in map(HigherLower._create_body, records) if body is not None]
+    catalog = BodyCatalog.from_records(records)
+    one_by_one = BodyCatalog()
+    for record in records:
+        one_by_one.add_record(record)
+    with tempfile.TemporaryDirectory() as directory:
+        catalog.write_snapshot(Path(directory) / "verify.snapshot")
+        snapshot = BodyCatalog.from_snapshot(Path(directory) / "verify.snapshot")
+
+        getters = ("get_name", "get_semimajor_axis", "get_eccentricity", "get_mass", "get_mass_raw", "get_gravity",
+                   "get_radius", "get_type")
+        displayed = {characteristic: "get_" + characteristic.lower().replace(" ", "_")
+                     for characteristic in BodyCatalog.UNITS if characteristic not in BodyCatalog.DERIVED}
+        for label, candidate in (("from_records", catalog), ("add_record", one_by_one), ("snapshot", snapshot)):
+            check("ingestion", len(candidate) == len(reference),
+                  lambda: f"{label} kept {len(candidate)} bodies, _create_body kept {len(reference)}")
+            for body, view in zip(reference, candidate.views()):
+                for getter in getters:
+                    expected, actual = getattr(body, getter)(), getattr(view, getter)()
+                    check("ingestion", expected == actual,
+                          lambda: f"{label} {getter} of {body.get_name()!r} is {actual!r}, expected {expected!r}")
+                for characteristic, getter in displayed.items():
+                    expected, actual = str(getattr(body, getter)()), view.display(characteristic)
+                    check("ingestion", expected == actual,
+                          lambda: f"{label} shows {characteristic} of {body.get_name()!r} as {actual!r}, "
+                                  f"expected {expected!r}")
+        del snapshot
+
+    # the other checks look the reference bodies up by their index in the catalog, so they need the same bodies.
+    if mismatches:
+        return counts, mismatches
+
+    # masses are spread over many orders of magnitude, and a third of them sit right at a rounding boundary.
+    values, exponents = list(), list()
+    for _ in range(cases // 2):
+        value = 10.0 ** rng.uniform(-6, 6)
+        if rng.random() < 1 / 3:
+            value = (math.floor(value * 1000) + 0.5) / 1000
+        values.append(value)
+        exponents.append(rng.randint(-5, 30))
+    mantissas, shifted = BodyCatalog._normalize_masses(values, exponents)
+    for value, exponent, mantissa, shift in zip(values, exponents, mantissas, shifted):
+        # like _create_body, only masses outside of [1, 10] are put into scientific notation.
+        expected = HigherLower._fix_mass(value, exponent) if value > 10 or value < 1 else (value, exponent)
+        check("masses", (mantissa, shift) == expected,
+              lambda: f"{value!r} x 10^{exponent} became {(mantissa, shift)}, expected {expected}")
+
+    # every answer is judged by the reference on the original bodies, where they have the getter (the derived
+    # characteristics only exist on the catalog's views), and by the catalog's sort keys.
+    views = list(catalog.views())
+    characteristics = tuple(BodyCatalog.UNITS)
+    batches = {characteristic: list() for characteristic in characteristics}
+    sink = FreePoints()
+    with contextlib.redirect_stdout(sink):
+        for _ in range(cases - cases // 2):
+            left, right = rng.randrange(len(views)), rng.randrange(len(views))
+            characteristic = rng.choice(characteristics)
+            answer = rng.choice(GameEngine.ANSWERS)
+            bodies = reference if characteristic not in BodyCatalog.DERIVED else views
+            printed = FreePoints.printed
+            expected = HigherLower._check_answer(bodies[left], bodies[right], characteristic, answer)
+            expected = expected, FreePoints.printed > printed
+            actual = catalog.judge(left, right, characteristic, answer)
+            check("judging", actual == expected,
+                  lambda: f"{answer} on {characteristic} of {left} and {right} gave {actual}, expected {expected}")
+            batches[characteristic].append((left, right, answer, expected[0]))
+
+        for characteristic, batch in batches.items():
+            judged = catalog.judge_many(characteristic, [(left, right, answer) for left, right, answer, _ in batch])
+            for (left, right, answer, expected), actual in zip(batch, judged):
+                check("judging", actual == expected,
+                      lambda: f"judge_many {answer} on {characteristic} of {left} and {right} gave {actual}")
+
+        # games are dealt by the engine with random settings, and every round is judged again.
+        engine = GameEngine(catalog)
+        scores = list()
+        for _ in range(max(1, cases // 1_000)):
+            settings = {characteristic: rng.random() < 0.5 for characteristic in characteristics}
+            settings[rng.choice(characteristics)] = True
+            game_seed = rng.getrandbits(64)
+            engine.new_game(settings, game_seed, adaptive=rng.random() < 0.5)
+            previous = None
+            while engine.is_alive() and engine.get_score() < 200:
+                played = engine.next_round()
+                left, right, characteristic = played.get_left(), played.get_right(), played.get_characteristic()
+                # like the original game, the left body carries over to the next category even if it has a value of
+                # 0 for it, so only the first body and every opponent have to be drawable.
+                column = catalog.column(characteristic)
+                check("games", left != right and column[right.get_index()] != 0
+                      and (column[left.get_index()] != 0 if previous is None else previous == left.get_index()),
+                      lambda: f"round {played.get_number()} of game {game_seed} dealt {left} and {right}")
+
+                # the answer is right nine times out of ten, so that games last long enough to cover many rounds.
+                bodies = reference if characteristic not in BodyCatalog.DERIVED else views
+                left_body, right_body = bodies[left.get_index()], bodies[right.get_index()]
+                higher = HigherLower._check_answer(left_body, right_body, characteristic, "HIGHER")
+                answer = "HIGHER" if higher != (rng.random() < 0.1) else "LOWER"
+                result = engine.submit(answer)
+                printed = FreePoints.printed
+                expected = HigherLower._check_answer(left_body, right_body, characteristic, answer)
+                expected = expected, FreePoints.printed > printed
+                actual = result.is_correct(), result.is_free_point()
+                check("games", actual == expected,
+                      lambda: f"round {played.get_number()} of game {game_seed} judged {answer} as {actual}, "
+                              f"expected {expected}")
+                previous = right.get_index() if result.is_correct() else None
+
+            score = engine.get_score()
+            replayed = GameEngine(catalog).replay(game_seed, settings, engine.get_answers(), engine.is_adaptive())
+            check("games", replayed == score, lambda: f"game {game_seed} scored {score} but replays to {replayed}")
+            scores.append((score, settings, game_seed))
+
+    # game seeds are spread over the whole unsigned 64-bit range, so half of them do not fit a signed integer.
+    with tempfile.TemporaryDirectory() as directory:
+        leaderboard = Leaderboard(Path(directory) / "verify.sqlite3", flush_interval=0)
+        for score, settings, game_seed in scores:
+            leaderboard.record(score, settings, seed=game_seed)
+        leaderboard.flush()
+        (stored,), = leaderboard._query("SELECT COUNT(*) FROM scores", ())
+        leaderboard.close()
+        leaderboard._local.connection.close()
+    check("scores", stored == len(scores), lambda: f"the leaderboard kept {stored} of {len(scores)} scores")
+    return counts, mismatches
+
+
+def _verify_cache(limit: int = 20) -> tuple:
+    """Checks SolarSystemCache against a stand-in for the API served by http.server on localhost, which answers
+    conditional requests with 304 while its ETag is unchanged. Returns ({"cache": number of cases}, [mismatches]):
+    a cold start downloads the payload, a fresh copy is served without a request, a stale copy is revalidated with
+    If-None-Match and kept on a 304, a changed payload replaces it, a background revalidation returns the stale copy
+    right away and stores the new one, and once the server is gone the stale copy is used offline."""
+    import http.server
+    import json
+    import tempfile
+    counts = {"cache": 0}
+    mismatches = list()
+
+    def check(same: bool, description) -> None:
+        counts["cache"] += 1
+        if not same and len(mismatches) < limit:
+            mismatches.append(f"cache: {description()}")
+
+    # the stand-in serves the current payload, and records the validator of every request it gets.
+    state = {"payload": b"", "etag": "", "requests": list()}
+
+    class StandIn(http.server.BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            state["requests"].append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == state["etag"]:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", state["etag"])
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(state["payload"])))
+            self.end_headers()
+            self.wfile.write(state["payload"])
+
+        def log_message(self, *args) -> None:
+            pass
+
+    def publish(version: int) -> bytes:
+        state["payload"] = json.dumps(synthetic_solar_system(20, version)).encode("utf-8")
+        state["etag"] = f'"v{version}"'
+        return state["payload"]
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, name="verify-cache", daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/rest/bodies/"
+    with tempfile.TemporaryDirectory() as directory:
+        cache, stale = SolarSystemCache(Path(directory), timeout=5), SolarSystemCache(Path(directory), ttl=0, timeout=5)
+        try:
+            first = publish(1)
+            payload = cache.load_raw(url)
+            check(payload == first and state["requests"] == [None],
+                  lambda: f"a cold start made the requests {state['requests']}")
+            check(CachedSource(url, cache).catalog().fingerprint() == BodyCatalog.from_records(
+                json.loads(first)["bodies"]).fingerprint(), lambda: "CachedSource built a different catalog")
+
+            payload = cache.load_raw(url)
+            check(payload == first and len(state["requests"]) == 1,
+                  lambda: f"a fresh copy made the requests {state['requests']}")
+
+            fetched = cache.read(url)[1]["fetched"]
+            payload = stale.load_raw(url)
+            check(payload == first and state["requests"][-1] == '"v1"',
+                  lambda: f"a stale copy was revalidated with {state['requests'][-1]!r}, expected '\"v1\"'")
+            check(cache.read(url)[1]["fetched"] > fetched, lambda: "a 304 did not renew the fetch time")
+
+            second = publish(2)
+            payload = stale.load_raw(url)
+            payload, metadata = cache.read(url)
+            check(payload == second and metadata["etag"] == '"v2"',
+                  lambda: "a changed payload did not replace the cached one")
+
+            third = publish(3)
+            payload = stale.load_raw(url, background=True)
+            check(payload == second, lambda: "a background revalidation did not return the stale copy right away")
+            deadline = time.monotonic() + 10
+            while cache.read(url)[0] != third and time.monotonic() < deadline:
+                sleep(0.01)
+            check(cache.read(url)[0] == third, lambda: "a background revalidation did not store the new payload")
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # the server is gone, so a stale copy is served offline and a missing one cannot be.
+        try:
+            payload = stale.load_raw(url)
+            check(payload == third, lambda: "the stale copy was not served offline")
+        except OSError as error:
+            check(False, lambda: f"the stale copy was not served offline ({error})")
+        try:
+            SolarSystemCache(Path(directory) / "empty", timeout=5).load_raw(url)
+            check(False, lambda: "a cold start offline did not fail")
+        except OSError:
+            check(True, None)
+    return counts, mismatches
+
+
+def verify(cases: int = 1_000_000, catalog_size: int = 1_000, processes: int | None = None,
+           chunk_size: int = 100_000, seed: int = 0) -> dict:
+    """Runs the differential checks of _verify_chunk on random catalogs, one per chunk of cases, across a process
+    pool, and the checks of _verify_cache once. Every fast path has to reproduce HigherLower's reference rules
+    exactly, so any mismatch is a bug.
+    Returns {"cases": {kind of check: number of cases}, "mismatches": [descriptions]}."""
+    import concurrent.futures
+    counts, mismatches = _verify_cache()
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(_verify_chunk, seed + start, min(chunk_size, cases - start), catalog_size)
+                   for start in range(0, cases, chunk_size)]
+        for future in concurrent.futures.as_completed(futures):
+            chunk_counts, chunk_mismatches = future.result()
+            for kind, count in chunk_counts.items():
+                counts[kind] = counts.get(kind, 0) + count
+            mismatches.extend(chunk_mismatches)
+    return {"cases": counts, "mismatches": mismatches}
+
+
+class SolarSystemCache:
+    """On-disk cache for the API response. It stores the raw payload next to its ETag/Last-Modified headers and the
+    time it was fetched. Later starts are served from disk, and once the copy is older than the TTL it is revalidated
+    with a conditional request (either right away or in the background). If the network is unavailable, the stale copy
+    is used instead, so the game can start fully offline once it has been cached."""
+    def __init__(self, directory: Path = CACHE_DIRECTORY, ttl: float = 24 * 60 * 60, timeout: float = 10):
+        self._directory = Path(directory)
+        self._ttl = ttl                         # seconds before a cached copy has to be revalidated.
+        self._timeout = timeout                 # seconds before a request to the API gives up.
+        self._lock = threading.Lock()
+
+    def _paths(self, url: str) -> tuple:
+        """Returns the payload and metadata paths for a URL."""
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self._directory / f"{key}.json", self._directory / f"{key}.meta.json"
+
+    def read(self, url: str) -> tuple:
+        """Returns the cached payload and its metadata, or (None, None) if the URL has not been cached."""
+        import json
+        payload_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as meta_file:
+                metadata = json.load(meta_file)
+            return payload_path.read_bytes(), metadata
+        except (OSError, ValueError):
+            return None, None
+
+    def is_fresh(self, metadata: dict | None) -> bool:
+        """Returns whether the cached copy is younger than the TTL."""
+        return metadata is not None and time.time() - metadata.get("fetched", 0) < self._ttl
+
+    def _write(self, url: str, payload: bytes | None, metadata: dict) -> None:
+        """Atomically replaces the cached payload (if given) and its metadata."""
+        import json
+        payload_path, meta_path = self._paths(url)
+        self._directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if payload is not None:
+                temporary = payload_path.with_suffix(".tmp")
+                temporary.write_bytes(payload)
+                os.replace(temporary, payload_path)
+            temporary = meta_path.with_suffix(".tmp")
+            temporary.write_text(json.dumps(metadata), encoding="utf-8")
+            os.replace(temporary, meta_path)
+
+    def refresh(self, url: str) -> bytes:
+        """Downloads the payload, sending the cached validators so that an unchanged payload is not downloaded again.
+        Returns the (possibly cached) payload."""
+        import urllib.error
+        import urllib.request
+        payload, metadata = self.read(url)
+        url_request = urllib.request.Request(url)
+        if payload is not None:
+            if metadata.get("etag"):
+                url_request.add_header("If-None-Match", metadata["etag"])
+            if metadata.get("last_modified"):
+                url_request.add_header("If-Modified-Since", metadata["last_modified"])
+
+        try:
+            with urllib.request.urlopen(url_request, timeout=self._timeout) as url_response:
+                payload = url_response.read()
+                metadata = {"url": url, "etag": url_response.headers.get("ETag"),
+                            "last_modified": url_response.headers.get("Last-Modified"), "fetched": time.time()}
+                self._write(url, payload, metadata)
+                return payload
+
+        except urllib.error.HTTPError as error:
+            # 304 means the cached copy is still current, so only its fetch time is updated.
+            if error.code != 304 or payload is None:
+                raise
+            metadata["fetched"] = time.time()
+            self._write(url, None, metadata)
+            return payload
+
+    def revalidate_in_background(self, url: str) -> threading.Thread:
+        """Refreshes the cached copy on a daemon thread. Network errors are ignored since the cache is still usable."""
+        def revalidate():
+            try:
+                self.refresh(url)
+            except (OSError, ValueError):
+                pass
+
+        thread = threading.Thread(target=revalidate, name="solar-system-cache", daemon=True)
+        thread.start()
+        return thread
+
+    def load_raw(self, url: str, background: bool = False) -> bytes:
+        """Returns the payload for a URL, downloading it only if the cached copy is missing or stale."""
+        payload, metadata = self.read(url)
+        if payload is None:
+            return self.refresh(url)
+        if self.is_fresh(metadata):
+            return payload
+        if background:
+            self.revalidate_in_background(url)
+            return payload
+
+        # the cached copy is stale, but it is still better than nothing if we are offline.
+        try:
+            return self.refresh(url)
+        except (OSError, ValueError):
+            return payload
+
+    def load(self, url: str, background: bool = False) -> dict:
+        """Returns the parsed JSON response for a URL, see load_raw."""
+        import json
+        return json.loads(self.load_raw(url, background).decode(encoding="utf-8"))
+
+
+class DataSource:
+    """Where the bodies of a catalog come from. Every source yields API records, which catalog() validates and builds
+    into a BodyCatalog, except for sources (like snapshots) that can build their catalog directly."""
+    def records(self):
+        """Yields the API records of every body in the source."""
+        raise NotImplementedError(f"{type(self).__name__}.records: this source does not provide API records.")
+
+    def catalog(self) -> BodyCatalog:
+        """Returns the catalog of every valid body in the source."""
+        return BodyCatalog.from_records(self.records())
+
+
+class FileSource(DataSource):
+    """A json file of the API's /rest/bodies/ response, streamed one body at a time."""
+    def __init__(self, file: Path, chunk_size: int = 1 << 16):
+        self._file = Path(file)
+        self._chunk_size = chunk_size
+
+    def records(self):
+        with open(self._file, encoding="utf-8") as json_file:
+            yield from iter_bodies(json_file, self._chunk_size)
+
+
+class SnapshotSource(DataSource):
+    """A binary catalog snapshot written by build_snapshot. Its catalog is mapped as is, and its records are rebuilt
+    from the catalog's rows (see BodyCatalog.record) for sources that merge records."""
+    def __init__(self, file: Path):
+        self._file = Path(file)
+
+    def records(self):
+        catalog = self.catalog()
+        return map(catalog.record, range(len(catalog)))
+
+    def catalog(self) -> BodyCatalog:
+        return BodyCatalog.from_snapshot(self._file)
+
+
+class CachedSource(DataSource):
+    """A single API URL served through the on-disk SolarSystemCache."""
+    def __init__(self, url: str, cache: SolarSystemCache | None = None, background: bool = True):
+        self._url = url
+        self._cache = SolarSystemCache() if cache is None else cache
+        self._background = background
+
+    def records(self):
+        return iter(self._cache.load(self._url, self._background)["bodies"])
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections to a single host, shared by the threads of an ApiSource.
+    Failed requests are retried on a fresh connection with exponential backoff."""
+    def __init__(self, url: str, size: int = 4, timeout: float = 10, retries: int = 3, backoff: float = 0.5):
+        import urllib.parse
+        parts = urllib.parse.urlsplit(url)
+        self._https = parts.scheme == "https"
+        self._host = parts.netloc
+        self._timeout = timeout                 # seconds before a single request gives up.
+        self._retries = retries                 # attempts after the first one fails.
+        self._backoff = backoff                 # seconds before the first retry, doubled after every retry.
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)                # connections are only opened once they are first needed.
+
+    def _connect(self) -> "http.client.HTTPConnection":
+        import http.client
+        if self._https:
+            return http.client.HTTPSConnection(self._host, timeout=self._timeout)
+        return http.client.HTTPConnection(self._host, timeout=self._timeout)
+
+    def get(self, path: str) -> bytes:
+        """Returns the body of a GET request, waiting for a free connection first."""
+        import http.client
+        import urllib.error
+        connection = self._idle.get()
+        try:
+            for attempt in range(self._retries + 1):
+                try:
+                    if connection is None:
+                        connection = self._connect()
+                    connection.request("GET", path, headers={"Accept": "application/json"})
+                    response = connection.getresponse()
+                    payload = response.read()
+                    if response.status >= 500:
+                        raise http.client.HTTPException(f"{path} returned {response.status}.")
+                    if response.status != 200:
+                        raise urllib.error.HTTPError(path, response.status, response.reason, response.headers, None)
+                    return payload
+                except (OSError, http.client.HTTPException) as error:
+                    # a 4xx will not go away by retrying it.
+                    if isinstance(error, urllib.error.HTTPError) or attempt == self._retries:
+                        raise
+                    if connection is not None:
+                        connection.close()
+                    connection = None
+                    sleep(self._backoff * 2 ** attempt)
+        finally:
+            self._idle.put(connection)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            connection = self._idle.get()
+            if connection is not None:
+                connection.close()
+
+
+class ApiSource(DataSource):
+    """The API's /rest/bodies/ endpoint, fetched as several filtered (or paginated) queries at once over a pool of
+    keep-alive connections, so a cold start is bound by bandwidth rather than by round-trips.
+    A body returned by more than one query is only kept once."""
+    def __init__(self, url: str = "https://api.le-systeme-solaire.net/rest/bodies/", queries=("",),
+                 connections: int = 4, timeout: float = 10, retries: int = 3):
+        self._url = url
+        self._queries = tuple(queries)          # query strings, e.g. "filter[]=bodyType,eq,Moon".
+        self._connections = connections
+        self._timeout = timeout
+        self._retries = retries
+
+    @classmethod
+    def by_body_type(cls, body_types=("Star", "Planet", "Dwarf Planet", "Moon", "Asteroid", "Comet"),
+                     **options) -> "ApiSource":
+        """Returns a source that fetches every body type with its own query."""
+        import urllib.parse
+        return cls(queries=[f"filter[]=bodyType,eq,{urllib.parse.quote(body_type)}" for body_type in body_types],
+                   **options)
+
+    def records(self):
+        import concurrent.futures
+        import json
+        import urllib.parse
+        # a query string in the URL itself is kept, and every query is added to it.
+        parts = urllib.parse.urlsplit(self._url)
+        queries = ["&".join(part for part in (parts.query, query) if part) for query in self._queries]
+        path = parts.path or "/"
+        pool = ConnectionPool(self._url, self._connections, self._timeout, self._retries)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(self._connections) as executor:
+                payloads = executor.map(pool.get, [f"{path}?{query}" if query else path for query in queries])
+                seen = set()
+                for payload in payloads:
+                    for record in json.loads(payload.decode(encoding="utf-8"))["bodies"]:
+                        if record.get("id") is None or record["id"] not in seen:
+                            seen.add(record.get("id"))
+                            yield record
+        finally:
+            pool.close()
+
+
+class MergedSource(DataSource):
+    """Several record sources merged into one catalog. If a body (by its id) appears in more than one source, the
+    first source that has it wins."""
+    def __init__(self, *sources: DataSource):
+        self._sources = sources
+
+    def records(self):
+        seen = set()
+        for source in self._sources:
+            for record in source.records():
+                if record.get("id") is None or record["id"] not in seen:
+                    seen.add(record.get("id"))
+                    yield record
+
+
+def parse_arguments(argv: list | None = None):
+    """Parses the command line. Without a source, the game asks for one just like it always has."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Higher-lower game for the bodies of our Solar System.")
+
+    source = parser.add_argument_group("source")
+    source.add_argument("--source", choices=("website", "file", "api"),
+                        help="where the bodies come from (asked for if not given).")
+    source.add_argument("--file", type=Path, help="json file or .snapshot catalog for --source file.")
+    source.add_argument("--url", default="https://api.le-systeme-solaire.net/rest/bodies/", help="API endpoint.")
+    source.add_argument("--query", action="append", default=None,
+                        help="query for --source api, e.g. 'filter[]=bodyType,eq,Moon' (repeatable).")
+
+    game = parser.add_argument_group("game")
+    game.add_argument("--settings", help="comma-separated categories to play with, which skips the instructions "
+                                         f"and the settings prompts ({', '.join(BodyCatalog.UNITS)}).")
+    game.add_argument("--seed", type=int, help="seed of the game, to play the same game again.")
+    game.add_argument("--adaptive", action="store_true",
+                      help="draws opponents from a difficulty band that tightens as the score rises.")
+    game.add_argument("--pace", type=float, default=1.0, help="multiplier for every pause (0 never pauses).")
+    game.add_argument("--cheat", choices=("yes", "no"), help="enables cheat mode without asking.")
+    game.add_argument("--output", choices=("shell", "lines"), default="shell",
+                      help="'lines' plays the server's line protocol over stdin/stdout, for scripts and bots.")
+
+    modes = parser.add_argument_group("modes")
+    modes.add_argument("--server", action="store_true", help="hosts many players at once.")
+    modes.add_argument("--host", default="127.0.0.1")
+    modes.add_argument("--port", type=int, default=4545)
+    modes.add_argument("--socket", help="Unix socket path for --server instead of TCP.")
+    modes.add_argument("--reload", type=float, metavar="SECONDS",
+                       help="reloads the source this often while --server runs, without ending any game.")
+    modes.add_argument("--benchmark", action="store_true", help="runs the benchmarks on synthetic catalogs.")
+    modes.add_argument("--build-snapshot", type=Path, metavar="OUT",
+                       help="writes the source's catalog to a .snapshot file that --file loads without any parsing.")
+    modes.add_argument("--simulate", type=int, metavar="GAMES", help="simulates players for every settings mix.")
+    modes.add_argument("--replay", type=Path, metavar="LOG", help="audits the games of a replay log.")
+    modes.add_argument("--verify", type=int, metavar="CASES",
+                       help="checks the fast paths against the original game rules on random catalogs, and the "
+                            "API cache against a local stand-in server.")
+
+    output = parser.add_argument_group("records")
+    output.add_argument("--record", type=Path, metavar="LOG", help="appends every finished game to a replay log.")
+    output.add_argument("--metrics", type=Path, metavar="FILE", help="writes metrics to a .json or Prometheus file.")
+    output.add_argument("--no-leaderboard", action="store_true", help="does not keep final scores.")
+
+    arguments = parser.parse_args(argv)
+    if arguments.settings is not None:
+        chosen = [category.strip().lower() for category in arguments.settings.split(",") if category.strip()]
+        unknown = [category for category in chosen if category not in map(str.lower, BodyCatalog.UNITS)]
+        if unknown or not chosen:
+            parser.error(f"--settings must name at least one of {', '.join(BodyCatalog.UNITS)}.")
+        arguments.settings = {category: category.lower() in chosen for category in BodyCatalog.UNITS}
+    if arguments.seed is not None and not 0 <= arguments.seed < GameEngine.SEED_LIMIT:
+        parser.error("--seed must be within [0, 2^64).")
+    if arguments.reload and arguments.record is not None:
+        parser.error("--record cannot be used with --reload, since a replay log is checked against a single catalog.")
+    if arguments.source == "file" and arguments.file is None:
+        parser.error("--source file needs --file.")
+    if arguments.build_snapshot is not None and arguments.build_snapshot.suffix != ".snapshot":
+        parser.error("--build-snapshot must end in .snapshot, since --file only loads snapshots by their suffix.")
+    return arguments
+
+
+def load_source(arguments) -> DataSource:
+    """Returns the source chosen on the command line, or asks for one."""
+    website_or_file = arguments.source
+    if website_or_file is None:
+        website_or_file = input("Would you like to use the website or a file ['website'/'file']?\n> ").lower()
+
+    if website_or_file == "website":
         # loads the game from the web API.
-        URL = "https://api.le-systeme-solaire.net/rest/bodies/"
-        print(f"For this project, the website pulls its data from the website and API {URL}.")
+        print(f"For this project, the website pulls its data from the website and API {arguments.url}.")
         print("~-"*58, end="~\n")
-        JSON = acquire_solar_system(URL)
-    elif website_or_file.lower() == "file":
+
+        # the response is cached on disk and revalidated in the background, so later starts work offline too.
+        source = CachedSource(arguments.url)
+    elif website_or_file == "api":
+        # fetches every query at once, without going through the cache.
+        source = ApiSource(arguments.url, arguments.query or ("",))
+    elif website_or_file == "file":
         # loads the game from a pre-downloaded file.
-        input_file = input("Please input the file (no quotation marks).\n> ").strip("\"")
+        file_path = arguments.file
+        if file_path is None:
+            file_path = Path(input("Please input the file (no quotation marks).\n> ").strip("\""))
 
         # IF YOU WISH TO USE A PRE-DOWNLOADED FILE, GO TO THE WEBSITE ABOVE, SAVE IT
         # AND MAKE COPY IT INTO THE PATH OBJECT. REPLACE EVERY / WITH "\\"
-        file_path = Path(input_file)
-        JSON = acquire_offline_solar_system(file_path)
+        # a catalog snapshot (see build_snapshot) skips parsing and filtering the json file entirely.
+        # otherwise, the json file is streamed one body at a time so that large dumps do not need to fit in memory.
+        source = SnapshotSource(file_path) if file_path.suffix == ".snapshot" else FileSource(file_path)
     else:
         raise ValueError("__main__: bro just type 'website' or 'file'")
 
-    # starts the game!
-    game = HigherLower(JSON)
+    return source
+
+
+def play_lines(catalog: BodyCatalog, arguments, replay_log: ReplayLog | None, leaderboard: Leaderboard | None) -> None:
+    """Plays a single GameSession over stdin/stdout. With a seed, the game starts without waiting for START."""
+    session = GameSession(catalog, replay_log, leaderboard, arguments.settings, arguments.adaptive)
+    commands = iter(sys.stdin.readline, "")
+    if arguments.seed is not None:
+        commands = itertools.chain([f"START {arguments.seed}"], commands)
+
+    for line in commands:
+        sys.stdout.write("".join(f"{reply}\n" for reply in session.handle(line)))
+        if session.wants_round():
+            if arguments.pace > 0:
+                sleep(GLOBAL_SLEEP / 2 * arguments.pace)
+            sys.stdout.write("".join(f"{reply}\n" for reply in session.deal()))
+        sys.stdout.flush()
+        if session.is_closed():
+            break
+
+
+def main(argv: list | None = None) -> None:
+    arguments = parse_arguments(argv)
+
+    # the benchmarks run offline against synthetic catalogs, so there is nothing to load.
+    if arguments.benchmark:
+        import json
+        for benchmark in run_benchmarks()["sizes"]:
+            print(json.dumps(benchmark))
+        return
+
+    # so do the differential checks, which fail the run if any fast path disagrees with the original rules.
+    if arguments.verify is not None:
+        report = verify(arguments.verify)
+        for mismatch in report["mismatches"]:
+            print(mismatch)
+        print(", ".join(f"{count} {kind}" for kind, count in report["cases"].items()) + " cases checked, "
+              f"{len(report['mismatches'])} mismatches.")
+        if report["mismatches"]:
+            sys.exit(1)
+        return
+
+    # collects metrics for the hot paths if asked to, and writes them to the file on exit.
+    METRICS.enabled = arguments.metrics is not None
+
+    source = load_source(arguments)
+    if arguments.reload and isinstance(source, SnapshotSource):
+        raise ValueError("__main__: a snapshot cannot be reloaded, use its json file instead.")
+
+    # builds a snapshot of the source once, so that later starts can skip parsing and filtering it.
+    if arguments.build_snapshot is not None:
+        catalog = build_snapshot(source, arguments.build_snapshot)
+        print(f"Wrote {len(catalog)} bodies to {arguments.build_snapshot}.")
+        return
+    catalog = source.catalog()
+
+    # final scores are kept on a local leaderboard unless asked not to.
+    keeps_scores = not (arguments.no_leaderboard or arguments.replay or arguments.simulate)
+    leaderboard = Leaderboard() if keeps_scores else None
+
+    # finished games are recorded to a replay log if one was given.
+    replay_log = None if arguments.record is None else ReplayLog(arguments.record, catalog)
+
+    try:
+        # audits a replay log, simulates many players, hosts many players at once if asked to,
+        # otherwise starts the game!
+        if arguments.replay is not None:
+            mismatches = ReplayLog(arguments.replay, catalog).audit()
+            for index, recorded, replayed in mismatches:
+                print(f"Game {index} was recorded with a score of {recorded}, but replays to {replayed}.")
+            print(f"{len(mismatches)} recorded games could not be reproduced.")
+        elif arguments.simulate is not None:
+            for (categories, player), histogram in simulate(catalog, arguments.simulate).items():
+                total = sum(histogram.values())
+                mean = sum(score * count for score, count in histogram.items()) / total
+                print(f"{player:>6}  {' + '.join(categories):<55}  mean = {mean:8.3f}  "
+                      f"max = {max(histogram):5}  games = {total}")
+        elif arguments.server:
+            import asyncio
+            print(f"Hosting the game on {arguments.socket or f'{arguments.host}:{arguments.port}'}...")
+            server = GameServer(catalog, GLOBAL_SLEEP / 2 * arguments.pace, replay_log, leaderboard, arguments.adaptive)
+            try:
+                asyncio.run(server.serve_forever(arguments.host, arguments.port, arguments.socket, source,
+                                                 arguments.reload))
+            except KeyboardInterrupt:
+                # stopping the server still writes the remaining scores and the metrics below.
+                pass
+        elif arguments.output == "lines":
+            play_lines(catalog, arguments, replay_log, leaderboard)
+        else:
+            cheat = None if arguments.cheat is None else arguments.cheat == "yes"
+            HigherLower(catalog, arguments.record, leaderboard, arguments.settings, arguments.seed, arguments.pace,
+                        cheat, adaptive=arguments.adaptive)
+    finally:
+        if leaderboard is not None:
+            leaderboard.close()
+        if arguments.metrics is not None:
+            METRICS.write(arguments.metrics)
+
+
+# Press the green button in the gutter to run the script.
+if __name__ == '__main__':
+    main()